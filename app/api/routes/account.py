@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from datetime import datetime
+from pydantic import TypeAdapter
 
-from ...services.auth import get_current_user
+from ...services.auth import get_current_user, get_current_principal
 from ...models.user import User
+from ...schemas.user import Principal
 from ...models.account import Account
-from ...schemas.account import CreateAccount
-from ...services.account import create_account_for_user, get_user_account, get_user_balance
+from ...schemas.account import CreateAccount, AccountSummary, BalanceResponse
+from ...services.account import create_account_for_user, get_user_account, get_user_balance, resolve_account_id
+from ...services.rollup import get_user_summary
+from ...services.stream import stream_hub, account_events
+from ...core.responses import typed_json, TypedJSONResponse
 
 
 router = APIRouter(prefix="/account", tags=["account"])
 
+account_adapter = TypeAdapter(Account)
+balance_adapter = TypeAdapter(BalanceResponse)
+
 @router.post("/create", status_code=status.HTTP_201_CREATED, response_model=Account)
 async def create_account(
     data: CreateAccount,
@@ -16,11 +27,37 @@ async def create_account(
 ):
     return await create_account_for_user(data.bvn, data.account_type, current_user)
 
-@router.get("/view", response_model=Account)
-async def get_account(current_user: User = Depends(get_current_user)):
-    return await get_user_account(current_user.id)
+@router.get("/view", response_model=Account, response_class=TypedJSONResponse)
+async def get_account(principal: Principal = Depends(get_current_principal)):
+    return typed_json(account_adapter, await get_user_account(principal.user_id, principal.account_id))
+
+@router.get("/balance", response_model=BalanceResponse, response_class=TypedJSONResponse)
+async def get_balance(principal: Principal = Depends(get_current_principal)):
+    balance = await get_user_balance(principal.user_id, principal.account_id)
+    return typed_json(balance_adapter, BalanceResponse.model_construct(balance=balance))
 
-@router.get("/balance")
-async def get_balance(current_user: User = Depends(get_current_user)):
-    balance = await get_user_balance(current_user.id)
-    return {"balance": balance}
\ No newline at end of file
+@router.get("/summary", response_model=AccountSummary)
+async def get_summary(
+    period: Literal["day", "month"] = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    principal: Principal = Depends(get_current_principal)
+):
+    return await get_user_summary(principal.user_id, period, start, end, principal.account_id)
+
+@router.get("/stream")
+async def stream_account(
+    last_event_id: Optional[str] = Header(None),
+    principal: Principal = Depends(get_current_principal)
+):
+    if not stream_hub.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Live updates are not available"
+        )
+    account_id = await resolve_account_id(principal.user_id, principal.account_id)
+    return StreamingResponse(
+        account_events(principal.user_id, account_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
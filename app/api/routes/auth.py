@@ -2,9 +2,12 @@ from fastapi import APIRouter, status, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import EmailStr
 
-from ...schemas.user import UserCreate, Token, NewPassword
-from ...services.auth import create_user, get_user_by_email, resend_verification_email, generate_password_reset, reset_user_password
-from ...core.security import verify_password, create_access_token, verify_user
+from ...schemas.user import UserCreate, Token, NewPassword, RefreshRequest, Principal
+from ...services.auth import (
+    create_user, get_user_by_email, resend_verification_email, generate_password_reset, reset_user_password,
+    issue_tokens, refresh_tokens, revoke_tokens, get_current_principal
+)
+from ...core.security import verify_password_async, verify_user
 from ...database import users_collection
 
 
@@ -24,7 +27,7 @@ async def register(user_data: UserCreate):
 @router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await get_user_by_email(form_data.username)
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -36,8 +39,16 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             detail="Please verify your email first"
         )
     
-    access_token = create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await issue_tokens(user)
+
+@router.post("/refresh", response_model=Token)
+async def refresh(refresh_data: RefreshRequest):
+    return await refresh_tokens(refresh_data.refresh_token)
+
+@router.post("/logout")
+async def logout(principal: Principal = Depends(get_current_principal)):
+    await revoke_tokens(principal)
+    return {"message": "Logged out successfully"}
 
 @router.get("/verify")
 async def verify_email(token: str):
@@ -1,32 +1,94 @@
-from fastapi import APIRouter, Depends
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Union, Literal
+from datetime import datetime
+from pydantic import TypeAdapter
 
 from ...models.transaction import Transaction
-from ...models.user import User
-from ...schemas.transaction import TransactionRequest, TransferRequest
-from ...services.auth import get_current_user
-from ...services.transaction import user_deposit, user_withdrawal, user_transfer, get_user_transactions
+from ...schemas.user import Principal
+from ...schemas.transaction import TransactionRequest, TransferRequest, BatchTransferRequest, BatchTransferResult, TransactionPage
+from ...services.auth import get_current_principal
+from ...services.idempotency import run_idempotent
+from ...core.responses import typed_json, TypedJSONResponse
+from ...services.transaction import user_deposit, user_withdrawal, user_transfer, user_batch_transfer, get_user_transactions, get_user_transactions_page, export_user_transactions
 
 
 router = APIRouter(prefix="/transaction", tags=["transaction"])
 
+transaction_list_adapter = TypeAdapter(List[Transaction])
+transaction_page_adapter = TypeAdapter(TransactionPage)
+
 @router.post("/deposit", response_model=Transaction)
-async def deposit(deposit_data: TransactionRequest, current_user: User = Depends(get_current_user)):
-    return await user_deposit(current_user.id, deposit_data.amount, deposit_data.description)
+async def deposit(
+    deposit_data: TransactionRequest,
+    idempotency_key: Optional[str] = Header(None),
+    principal: Principal = Depends(get_current_principal)
+):
+    return await run_idempotent(
+        principal.user_id, idempotency_key, "deposit", deposit_data,
+        lambda claim: user_deposit(principal.user_id, deposit_data.amount, deposit_data.description, principal.account_id, claim)
+    )
 
 @router.post("/withdraw", response_model=Transaction)
-async def withdraw(withdraw_data: TransactionRequest, current_user: User = Depends(get_current_user)):
-    return await user_withdrawal(current_user.id, withdraw_data.amount, withdraw_data.description)
+async def withdraw(
+    withdraw_data: TransactionRequest,
+    idempotency_key: Optional[str] = Header(None),
+    principal: Principal = Depends(get_current_principal)
+):
+    return await run_idempotent(
+        principal.user_id, idempotency_key, "withdraw", withdraw_data,
+        lambda claim: user_withdrawal(principal.user_id, withdraw_data.amount, withdraw_data.description, principal.account_id, claim)
+    )
 
 @router.post("/transfer", response_model=Transaction)
-async def transfer(transfer_data: TransferRequest, current_user: User = Depends(get_current_user)):
-    return await user_transfer(current_user.id, transfer_data.to_account_number, transfer_data.amount, transfer_data.description)
+async def transfer(
+    transfer_data: TransferRequest,
+    idempotency_key: Optional[str] = Header(None),
+    principal: Principal = Depends(get_current_principal)
+):
+    return await run_idempotent(
+        principal.user_id, idempotency_key, "transfer", transfer_data,
+        lambda claim: user_transfer(principal.user_id, transfer_data.to_account_number, transfer_data.amount, transfer_data.description, principal.account_id, claim)
+    )
+
+@router.post("/transfer/batch", response_model=BatchTransferResult)
+async def transfer_batch(
+    batch_data: BatchTransferRequest,
+    idempotency_key: Optional[str] = Header(None),
+    principal: Principal = Depends(get_current_principal)
+):
+    return await run_idempotent(
+        principal.user_id, idempotency_key, "transfer_batch", batch_data,
+        lambda claim: user_batch_transfer(principal.user_id, batch_data.transfers, principal.account_id, claim)
+    )
     
-@router.get("/transactions", response_model=List[Transaction])
+@router.get("/transactions", response_model=Union[List[Transaction], TransactionPage], response_class=TypedJSONResponse)
 async def get_transactions(
     skip: int = 0,
     limit: int = 10,
     transaction_type: Optional[str] = None,
-    current_user: User = Depends(get_current_user)
+    cursor: bool = False,
+    after: Optional[str] = None,
+    principal: Principal = Depends(get_current_principal)
+):
+    if cursor or after:
+        page = await get_user_transactions_page(principal.user_id, limit, after, transaction_type, principal.account_id)
+        return typed_json(transaction_page_adapter, page)
+    transactions = await get_user_transactions(principal.user_id, skip, limit, transaction_type, principal.account_id)
+    return typed_json(transaction_list_adapter, transactions)
+
+@router.get("/export")
+async def export_transactions(
+    format: Literal["csv", "ndjson"] = "csv",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    transaction_type: Optional[str] = None,
+    principal: Principal = Depends(get_current_principal)
 ):
-    return await get_user_transactions(current_user.id, skip, limit, transaction_type)
\ No newline at end of file
+    rows = await export_user_transactions(principal.user_id, format, start, end, transaction_type, principal.account_id)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        rows,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=statement.{format}"}
+    )
\ No newline at end of file
@@ -0,0 +1,24 @@
+from decimal import Decimal
+from bson.codec_options import CodecOptions, TypeEncoder, TypeRegistry
+from bson.decimal128 import Decimal128
+
+
+class DecimalEncoder(TypeEncoder):
+    python_type = Decimal
+
+    def transform_python(self, value: Decimal) -> Decimal128:
+        return Decimal128(value)
+
+
+# Only encoding is registered. A decoder would call back into Python for every
+# Decimal128 in every document; reads instead convert their money fields once
+# in app/models/mapping.py.
+codec_options = CodecOptions(type_registry=TypeRegistry([DecimalEncoder()]))
+
+
+def to_decimal(value) -> Decimal:
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
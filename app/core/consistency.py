@@ -0,0 +1,114 @@
+import base64
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+import bson
+from bson.timestamp import Timestamp
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+from ..database import db
+from .cache import TTLCache
+
+
+MONGODB_READ_PREFERENCE = os.getenv("MONGODB_READ_PREFERENCE", "primary")
+MONGODB_MAX_STALENESS_SECONDS = int(os.getenv("MONGODB_MAX_STALENESS_SECONDS", "-1"))
+CAUSAL_TOKEN_TTL_SECONDS = float(os.getenv("CAUSAL_TOKEN_TTL_SECONDS", "120"))
+CAUSAL_TOKEN_CACHE_SIZE = int(os.getenv("CAUSAL_TOKEN_CACHE_SIZE", "100000"))
+
+CAUSAL_TOKEN_HEADER = "X-Causal-Token"
+
+READ_PREFERENCES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+SECONDARY_READS = MONGODB_READ_PREFERENCE != "primary"
+read_preference = (
+    READ_PREFERENCES[MONGODB_READ_PREFERENCE](max_staleness=MONGODB_MAX_STALENESS_SECONDS)
+    if SECONDARY_READS else Primary()
+)
+
+# user_id -> {"operationTime", "clusterTime"} of that user's last write through this worker.
+causal_tokens = TTLCache(maxsize=CAUSAL_TOKEN_CACHE_SIZE, ttl=CAUSAL_TOKEN_TTL_SECONDS)
+
+_request_state: ContextVar[Optional[dict]] = ContextVar("causal_request_state", default=None)
+
+
+def encode_token(token: dict) -> str:
+    return base64.urlsafe_b64encode(bson.encode(token)).decode()
+
+def decode_token(value: str) -> Optional[dict]:
+    # The header is client-controlled: anything the session would reject is
+    # dropped rather than failing the read.
+    try:
+        token = bson.decode(base64.urlsafe_b64decode(value.encode()))
+    except Exception:
+        return None
+    if not isinstance(token.get("operationTime"), Timestamp):
+        return None
+    cluster_time = token.get("clusterTime")
+    if cluster_time is not None and not (
+        isinstance(cluster_time, dict) and isinstance(cluster_time.get("clusterTime"), Timestamp)
+    ):
+        return None
+    return token
+
+def begin_request(header_value: Optional[str]) -> dict:
+    # The dict is shared with the request handler's context, so writes made
+    # while handling the request show up here for the response header.
+    state = {"read_after": decode_token(header_value) if header_value else None, "written": None}
+    _request_state.set(state)
+    return state
+
+def record_write(user_id: str, session):
+    if not SECONDARY_READS or session is None or session.operation_time is None:
+        return
+    token = {"operationTime": session.operation_time}
+    if session.cluster_time:
+        token["clusterTime"] = session.cluster_time
+
+    causal_tokens.set(user_id, token)
+    state = _request_state.get()
+    if state is not None:
+        state["written"] = token
+
+def reader(collection):
+    if not SECONDARY_READS:
+        return collection
+    return collection.with_options(read_preference=read_preference)
+
+@asynccontextmanager
+async def write_session(user_id: str):
+    if not SECONDARY_READS:
+        yield None
+        return
+    async with await db.client.start_session(causal_consistency=True) as session:
+        try:
+            yield session
+        finally:
+            record_write(user_id, session)
+
+@asynccontextmanager
+async def read_session(user_id: Optional[str] = None):
+    state = _request_state.get()
+    tokens = [
+        token for token in (
+            causal_tokens.get(user_id) if user_id else None,
+            state["read_after"] if state else None
+        ) if token
+    ]
+    if not SECONDARY_READS or not tokens:
+        yield None
+        return
+
+    # Reads in this session wait (afterClusterTime) until the chosen member has
+    # applied the user's last write.
+    async with await db.client.start_session(causal_consistency=True) as session:
+        for token in tokens:
+            if token.get("clusterTime"):
+                session.advance_cluster_time(token["clusterTime"])
+            session.advance_operation_time(token["operationTime"])
+        yield session
@@ -0,0 +1,186 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from typing import Callable, Dict, Iterable, Tuple
+from pymongo import monitoring
+
+
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "0.01"))
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = ['%s="%s"' % (name, value) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, "") for name in self.labels), 0)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{labels} {bucket_count}"
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {count}"
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.callback()}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+))
+MONGO_COMMAND_DURATION = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("command", "collection")
+))
+MONGO_COMMANDS = registry.register(Counter(
+    "mongo_commands_total", "MongoDB commands issued", ("command", "collection", "outcome")
+))
+TRANSACTION_ABORTS = registry.register(Counter(
+    "mongo_transaction_aborts_total", "Multi-document transactions aborted", ("operation",)
+))
+TRANSACTION_RETRIES = registry.register(Counter(
+    "mongo_transaction_retries_total", "Multi-document transaction attempts retried", ("operation", "reason")
+))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        collection = value if isinstance(value, str) else ""
+        with self._lock:
+            self._collections[(event.request_id, event.connection_id)] = collection
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection = self._collections.pop((event.request_id, event.connection_id), "")
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 1_000_000, command=event.command_name, collection=collection)
+        MONGO_COMMANDS.inc(command=event.command_name, collection=collection, outcome=outcome)
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+
+command_metrics = CommandMetrics()
+
+
+_log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+request_logger = logging.getLogger("user_money.requests")
+request_logger.setLevel(logging.INFO)
+request_logger.propagate = False
+request_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+
+
+def start_request_logging():
+    if REQUEST_LOG_SAMPLE_RATE > 0:
+        _log_listener.start()
+
+def stop_request_logging():
+    if REQUEST_LOG_SAMPLE_RATE > 0:
+        _log_listener.stop()
+
+def observe_request(method: str, route: str, status_code: int, duration: float):
+    REQUEST_DURATION.observe(duration, method=method, route=route, status=str(status_code))
+    if REQUEST_LOG_SAMPLE_RATE > 0 and random.random() < REQUEST_LOG_SAMPLE_RATE:
+        request_logger.info(json.dumps({
+            "method": method,
+            "route": route,
+            "status": status_code,
+            "duration_ms": round(duration * 1000, 3),
+        }))
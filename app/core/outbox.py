@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List, Optional
+import aiosmtplib
+from pymongo import UpdateOne
+
+from ..database import email_outbox_collection
+
+
+EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "465"))
+EMAIL_USERNAME= os.getenv("EMAIL_USERNAME")
+EMAIL_PASSWORD= os.getenv("EMAIL_PASSWORD")
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "true").lower() == "true"
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "2"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+EMAIL_POLL_INTERVAL_SECONDS = float(os.getenv("EMAIL_POLL_INTERVAL_SECONDS", "1.0"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "5"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+EMAIL_LEASE_SECONDS = float(os.getenv("EMAIL_LEASE_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: "asyncio.Queue[aiosmtplib.SMTP]" = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(self._new_connection())
+
+    def _new_connection(self) -> aiosmtplib.SMTP:
+        return aiosmtplib.SMTP(hostname=EMAIL_HOST, port=EMAIL_PORT, use_tls=EMAIL_USE_TLS)
+
+    async def _ensure_connected(self, smtp: aiosmtplib.SMTP):
+        if smtp.is_connected:
+            return
+        await smtp.connect()
+        if EMAIL_USERNAME and EMAIL_PASSWORD:
+            await smtp.login(EMAIL_USERNAME, EMAIL_PASSWORD)
+
+    async def send(self, message: EmailMessage):
+        smtp = await self._idle.get()
+        try:
+            await self._ensure_connected(smtp)
+            await smtp.send_message(message)
+        except Exception:
+            smtp.close()
+            smtp = self._new_connection()
+            raise
+        finally:
+            self._idle.put_nowait(smtp)
+
+    async def close(self):
+        while not self._idle.empty():
+            smtp = self._idle.get_nowait()
+            if smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except aiosmtplib.SMTPException:
+                    smtp.close()
+
+
+class EmailOutboxWorker:
+    def __init__(self, pool_size: int = EMAIL_POOL_SIZE, batch_size: int = EMAIL_BATCH_SIZE):
+        self.worker_id = secrets.token_hex(8)
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+        self.sent = 0
+        self.failed = 0
+        self.errors = 0
+        self._pool: Optional[SMTPPool] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    def start(self):
+        if self._task is None:
+            self._pool = SMTPPool(self.pool_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._pool.close()
+
+    def notify(self):
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_batch()
+            except Exception:
+                self.errors += 1
+                logger.exception("Email outbox batch failed")
+                processed = 0
+
+            if processed < self.batch_size:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), EMAIL_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _claim_batch(self) -> List[dict]:
+        now = datetime.utcnow()
+        expired = {"status": "sending", "lease_expires_at": {"$lte": now}}
+        pending = {"status": "pending", "next_attempt_at": {"$lte": now}}
+        due = {"$or": [pending, expired]}
+        # Each branch is read in the order of its own index, so neither needs
+        # an in-memory sort. Abandoned leases go first.
+        ids = [
+            row["_id"]
+            async for row in email_outbox_collection.find(expired, {"_id": 1}).sort("lease_expires_at", 1).limit(self.batch_size)
+        ]
+        if len(ids) < self.batch_size:
+            ids += [
+                row["_id"]
+                async for row in email_outbox_collection.find(pending, {"_id": 1}).sort("next_attempt_at", 1).limit(self.batch_size - len(ids))
+            ]
+        if not ids:
+            return []
+
+        await email_outbox_collection.update_many(
+            {"_id": {"$in": ids}, **due},
+            {
+                "$set": {
+                    "status": "sending",
+                    "claimed_by": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=EMAIL_LEASE_SECONDS)
+                }
+            }
+        )
+        return await email_outbox_collection.find(
+            {"_id": {"$in": ids}, "status": "sending", "claimed_by": self.worker_id}
+        ).to_list(length=len(ids))
+
+    async def _deliver(self, row: dict) -> Optional[Exception]:
+        message = EmailMessage()
+        message["FROM"] = EMAIL_USERNAME
+        message["TO"] = row["to"]
+        message["Subject"] = row["subject"]
+        message.add_alternative(row["html"], subtype="html")
+        try:
+            await self._pool.send(message)
+        except Exception as e:
+            return e
+        return None
+
+    async def process_batch(self) -> int:
+        rows = await self._claim_batch()
+        if not rows:
+            return 0
+
+        errors = await asyncio.gather(*(self._deliver(row) for row in rows))
+        now = datetime.utcnow()
+        updates = []
+        for row, error in zip(rows, errors):
+            if error is None:
+                self.sent += 1
+                updates.append(UpdateOne(
+                    {"_id": row["_id"]},
+                    {"$set": {"status": "sent", "sent_at": now, "updated_at": now}}
+                ))
+                continue
+
+            attempts = row.get("attempts", 0) + 1
+            delay = min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+            if attempts >= EMAIL_MAX_ATTEMPTS:
+                self.failed += 1
+            updates.append(UpdateOne(
+                {"_id": row["_id"]},
+                {
+                    "$set": {
+                        "status": "failed" if attempts >= EMAIL_MAX_ATTEMPTS else "pending",
+                        "attempts": attempts,
+                        "last_error": str(error),
+                        "next_attempt_at": now + timedelta(seconds=delay),
+                        "updated_at": now
+                    }
+                }
+            ))
+
+        await email_outbox_collection.bulk_write(updates, ordered=False)
+        return len(rows)
+
+
+email_outbox_worker = EmailOutboxWorker()
+
+async def enqueue_email(email: str, subject: str, html: str):
+    now = datetime.utcnow()
+    await email_outbox_collection.insert_one({
+        "to": email,
+        "subject": subject,
+        "html": html,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        "updated_at": now
+    })
+    email_outbox_worker.notify()
@@ -0,0 +1,32 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+
+
+def encode_cursor(timestamp: datetime, object_id: ObjectId) -> str:
+    payload = json.dumps([timestamp.isoformat(), str(object_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, object_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def keyset_filter(cursor: str, field: str = "timestamp") -> dict:
+    timestamp, object_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {field: {"$lt": timestamp}},
+            {field: timestamp, "_id": {"$lt": object_id}}
+        ]
+    }
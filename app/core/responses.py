@@ -0,0 +1,13 @@
+from typing import Any
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+
+class TypedJSONResponse(Response):
+    media_type = "application/json"
+
+
+def typed_json(adapter: TypeAdapter, content: Any, status_code: int = 200) -> TypedJSONResponse:
+    # Returning a Response makes FastAPI skip response_model re-validation;
+    # the route's response_model is still used for the OpenAPI schema.
+    return TypedJSONResponse(adapter.dump_json(content), status_code=status_code)
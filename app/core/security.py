@@ -1,23 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from passlib.context import CryptContext
 from jose import jwt
 from fastapi import HTTPException, status
 import os 
-from dotenv import load_dotenv
+import secrets
 
 from ..database import users_collection
+from .cache import TTLCache
 
 
-load_dotenv()
-
 SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret")  
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bcrypt")
+        self._semaphore = asyncio.Semaphore(concurrency)
 
+    async def run(self, func, *args):
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
 
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+        }
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_CONCURRENCY)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -25,6 +68,12 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     try:
         to_encode = data.copy()
@@ -42,6 +91,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
             detail="Failed to create access token"
         )
 
+def create_refresh_token(data: dict) -> str:
+    return create_access_token(
+        {**data, "typ": "refresh", "jti": secrets.token_urlsafe(16)},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+
 async def verify_user(token: str) -> bool:
     user_data = await users_collection.find_one({"verification_token": token})
     if user_data:
@@ -52,5 +107,6 @@ async def verify_user(token: str) -> bool:
                 "$currentDate": {"updated_at": True}
             }
         )
+        principal_cache.invalidate(user_data["email"])
         return True
     return False
\ No newline at end of file
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import random
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+from pymongo.errors import PyMongoError
+
+from ..database import db
+from .metrics import TRANSACTION_ABORTS, TRANSACTION_RETRIES
+
+
+TRANSACTION_MAX_RETRIES = int(os.getenv("TRANSACTION_MAX_RETRIES", "5"))
+TRANSACTION_RETRY_BASE_SECONDS = float(os.getenv("TRANSACTION_RETRY_BASE_SECONDS", "0.005"))
+TRANSACTION_RETRY_MAX_SECONDS = float(os.getenv("TRANSACTION_RETRY_MAX_SECONDS", "0.25"))
+ACCOUNT_LOCKS = os.getenv("ACCOUNT_LOCKS", "false").lower() == "true"
+ACCOUNT_LOCK_STRIPES = int(os.getenv("ACCOUNT_LOCK_STRIPES", "1024"))
+
+T = TypeVar("T")
+
+
+async def _backoff(attempt: int):
+    delay = min(TRANSACTION_RETRY_BASE_SECONDS * 2 ** attempt, TRANSACTION_RETRY_MAX_SECONDS)
+    await asyncio.sleep(random.uniform(0, delay))
+
+async def _commit(session, operation: str, max_retries: int):
+    attempt = 0
+    while True:
+        try:
+            await session.commit_transaction()
+            return
+        except PyMongoError as e:
+            if e.has_error_label("UnknownTransactionCommitResult") and attempt < max_retries:
+                TRANSACTION_RETRIES.inc(operation=operation, reason="unknown_commit_result")
+                await _backoff(attempt)
+                attempt += 1
+                continue
+            raise
+
+async def run_transaction(
+        callback: Callable[..., Awaitable[T]],
+        operation: str,
+        max_retries: int = TRANSACTION_MAX_RETRIES,
+        on_commit: Optional[Callable[..., None]] = None
+) -> T:
+    async with await db.client.start_session() as session:
+        attempt = 0
+        while True:
+            session.start_transaction()
+            try:
+                result = await callback(session)
+                await _commit(session, operation, max_retries)
+                if on_commit is not None:
+                    on_commit(session)
+                return result
+            except Exception as e:
+                if session.in_transaction:
+                    await session.abort_transaction()
+                if (
+                    isinstance(e, PyMongoError)
+                    and e.has_error_label("TransientTransactionError")
+                    and attempt < max_retries
+                ):
+                    TRANSACTION_RETRIES.inc(operation=operation, reason="transient")
+                    await _backoff(attempt)
+                    attempt += 1
+                    continue
+                # Rejections raised by the callback (HTTPException, a reused
+                # idempotency key, a stale batch) are not database aborts.
+                if isinstance(e, PyMongoError):
+                    TRANSACTION_ABORTS.inc(operation=operation)
+                raise
+
+
+class StripedLocks:
+    def __init__(self, stripes: int, enabled: bool = True):
+        self.enabled = enabled
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+
+    @asynccontextmanager
+    async def hold(self, *keys: Hashable):
+        if not self.enabled:
+            yield
+            return
+
+        # Acquire in stripe order so overlapping key sets can never deadlock.
+        locks = [self._locks[index] for index in sorted({hash(key) % len(self._locks) for key in keys})]
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+account_locks = StripedLocks(ACCOUNT_LOCK_STRIPES, enabled=ACCOUNT_LOCKS)
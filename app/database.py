@@ -1,14 +1,100 @@
+import asyncio
 import os
-from dotenv import load_dotenv
+from typing import Optional
 import motor.motor_asyncio
 
-load_dotenv()
+from .core.codecs import codec_options
+from .core.metrics import command_metrics
 
 
-client = motor.motor_asyncio.AsyncIOMotorClient(os.environ["MONGODB_URL"])
-db = client.user_money_v2
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "user_money_v2")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "0")) or None
+MONGODB_COMPRESSORS = os.getenv("MONGODB_COMPRESSORS", "")
 
 
-users_collection = db.get_collection("users")
-accounts_collection = db.get_collection("accounts")
-transactions_collection = db.get_collection("transactions")
+class Database:
+    def __init__(self, name: str = MONGODB_DATABASE):
+        self.name = name
+        self._client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
+        self._database = None
+
+    def connect(self) -> motor.motor_asyncio.AsyncIOMotorClient:
+        if self._client is None:
+            options = {
+                "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+                "minPoolSize": MONGODB_MIN_POOL_SIZE,
+                "connectTimeoutMS": MONGODB_CONNECT_TIMEOUT_MS,
+                "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                "socketTimeoutMS": MONGODB_SOCKET_TIMEOUT_MS,
+                "event_listeners": [command_metrics],
+            }
+            if MONGODB_COMPRESSORS:
+                options["compressors"] = MONGODB_COMPRESSORS
+
+            self._client = motor.motor_asyncio.AsyncIOMotorClient(os.environ["MONGODB_URL"], **options)
+            self._database = self._client.get_database(self.name, codec_options=codec_options)
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._database = None
+
+    @property
+    def client(self) -> motor.motor_asyncio.AsyncIOMotorClient:
+        return self.connect()
+
+    def get_collection(self, name: str):
+        self.connect()
+        return self._database.get_collection(name)
+
+    async def create_collection(self, name: str, **options):
+        self.connect()
+        return await self._database.create_collection(name, **options)
+
+    async def warm_up(self):
+        # Open minPoolSize connections up front so the first requests don't pay
+        # for TCP/TLS handshakes.
+        await asyncio.gather(*(
+            self.client.admin.command("ping") for _ in range(max(1, MONGODB_MIN_POOL_SIZE))
+        ))
+
+
+class LazyCollection:
+    def __init__(self, database: Database, name: str):
+        self._db = database
+        self._name = name
+        self._client = None
+        self._collection = None
+
+    def _resolve(self):
+        client = self._db.client
+        if self._collection is None or self._client is not client:
+            self._collection = self._db.get_collection(self._name)
+            self._client = client
+        return self._collection
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def __getattr__(self, attribute):
+        return getattr(self._resolve(), attribute)
+
+
+db = Database()
+
+
+users_collection = LazyCollection(db, "users")
+accounts_collection = LazyCollection(db, "accounts")
+transactions_collection = LazyCollection(db, "transactions")
+email_outbox_collection = LazyCollection(db, "email_outbox")
+counters_collection = LazyCollection(db, "counters")
+rollups_collection = LazyCollection(db, "account_rollups")
+checkpoints_collection = LazyCollection(db, "balance_checkpoints")
+idempotency_collection = LazyCollection(db, "idempotency_keys")
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from typing import Iterator, List
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from .database import db
+from .core.pagination import encode_cursor, keyset_filter
+from .services.idempotency import IDEMPOTENCY_TTL_SECONDS
+
+
+INDEX_CHECK_ON_STARTUP = os.getenv("INDEX_CHECK_ON_STARTUP", "false").lower() == "true"
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("verification_token", ASCENDING)], name="verification_token"),
+        IndexModel([("reset_token", ASCENDING)], name="reset_token"),
+    ],
+    "accounts": [
+        IndexModel([("account_number", ASCENDING)], name="account_number_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("account_type", ASCENDING)], name="user_account_type_unique", unique=True),
+    ],
+    "transactions": [
+        IndexModel(
+            [("account_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="account_history"
+        ),
+        IndexModel(
+            [("legs.account_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="leg_history"
+        ),
+        IndexModel([("timestamp", ASCENDING), ("_id", ASCENDING)], name="timestamp_id"),
+    ],
+    "account_rollups": [
+        IndexModel(
+            [("account_id", ASCENDING), ("period", ASCENDING), ("bucket_start", ASCENDING)],
+            name="account_period_bucket_unique",
+            unique=True
+        ),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease"),
+    ],
+}
+
+# Created on every monthly transactions archive collection by the tiering job.
+ARCHIVE_INDEXES = [
+    IndexModel(
+        [("account_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+        name="account_history"
+    ),
+    IndexModel(
+        [("legs.account_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+        name="leg_history"
+    ),
+]
+
+LEDGER_FILTER = {"$or": [{"legs.account_id": "account"}, {"account_id": "account"}]}
+KEYSET_FILTER = keyset_filter(encode_cursor(datetime(2000, 1, 1), ObjectId("0" * 24)))
+
+# Representative shapes of every query the services issue; each one must be
+# answered from an index, including its sort.
+QUERY_CHECKS = [
+    ("users", {"email": "user@example.com"}, None),
+    ("users", {"verification_token": "token"}, None),
+    ("users", {"reset_token": "token", "reset_token_expires": {"$gt": datetime(2000, 1, 1)}}, None),
+    ("accounts", {"account_number": "0000000000"}, None),
+    ("accounts", {"user_id": "user", "account_type": "savings"}, None),
+    ("accounts", {"user_id": "user"}, None),
+    ("transactions", LEDGER_FILTER, [("timestamp", -1), ("_id", -1)]),
+    ("transactions", {**LEDGER_FILTER, "transaction_type": "deposit"}, [("timestamp", -1), ("_id", -1)]),
+    ("transactions", {"$and": [LEDGER_FILTER, KEYSET_FILTER]}, [("timestamp", -1), ("_id", -1)]),
+    ("transactions", {"timestamp": {"$lt": datetime(2000, 1, 1)}}, [("timestamp", 1), ("_id", 1)]),
+    ("account_rollups", {"account_id": "account", "period": "day", "bucket_start": {"$gte": datetime(2000, 1, 1)}}, [("bucket_start", 1)]),
+    ("email_outbox", {"status": "pending", "next_attempt_at": {"$lte": datetime(2000, 1, 1)}}, [("next_attempt_at", 1)]),
+    ("email_outbox", {"status": "sending", "lease_expires_at": {"$lte": datetime(2000, 1, 1)}}, [("lease_expires_at", 1)]),
+]
+# COLLSCAN reads the whole collection; SORT sorts every match in memory.
+# SORT_MERGE only merges index-ordered branches and is fine.
+UNINDEXED_STAGES = {"COLLSCAN", "SORT"}
+
+
+class IndexCheckError(RuntimeError):
+    pass
+
+
+async def ensure_indexes():
+    for collection_name, indexes in INDEXES.items():
+        await db.get_collection(collection_name).create_indexes(indexes)
+
+def _stages(plan) -> Iterator[str]:
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+async def verify_index_usage() -> List[str]:
+    failures = []
+    for collection_name, query, sort in QUERY_CHECKS:
+        cursor = db.get_collection(collection_name).find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        stages = UNINDEXED_STAGES.intersection(_stages(explanation["queryPlanner"]["winningPlan"]))
+        if stages:
+            failures.append(f"{collection_name}: {query} sort={sort} ({', '.join(sorted(stages))})")
+
+    if failures:
+        raise IndexCheckError("Queries without index support:\n" + "\n".join(failures))
+    return [f"{collection_name}: {query}" for collection_name, query, _ in QUERY_CHECKS]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and verify MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="explain() every service query and fail on COLLSCAN or in-memory SORT")
+    args = parser.parse_args()
+
+    async def main():
+        await ensure_indexes()
+        if args.check:
+            for checked in await verify_index_usage():
+                print(f"ok  {checked}")
+
+    asyncio.run(main())
@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import time
+from array import array
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional, Sequence, Tuple
+from pymongo import UpdateOne
+
+from ..core.transactions import run_transaction
+from ..database import accounts_collection, transactions_collection, counters_collection
+from ..models.journal import JournalEntry, JournalLeg
+from ..models.mapping import transaction_from_entry
+from ..services.balance import balance_of
+from ..services.rollup import record_rollups
+from .reconcile import shard_bounds
+
+
+# JSON list of [minimum balance, annual rate] pairs, e.g. [["0", "0.03"], ["1000000", "0.045"]].
+INTEREST_RATE_TIERS = os.getenv("INTEREST_RATE_TIERS", "")
+INTEREST_SHARDS = int(os.getenv("INTEREST_SHARDS", "8"))
+INTEREST_BATCH_SIZE = int(os.getenv("INTEREST_BATCH_SIZE", "1000"))
+INTEREST_BATCH_ATTEMPTS = 3
+
+DAYS_PER_YEAR = 365
+MINOR_UNITS = 100
+# Sub-kobo interest is carried on the account between runs, in millionths of a kobo.
+CARRY_SCALE = 10 ** 6
+
+
+class StaleBatch(Exception):
+    pass
+
+
+def _to_minor(amount: Decimal) -> int:
+    return int(amount * MINOR_UNITS)
+
+def _from_minor(amount: int) -> Decimal:
+    return Decimal(amount) / MINOR_UNITS
+
+
+class RateTable:
+    def __init__(self, tiers: Sequence[Tuple[Decimal, Decimal]]):
+        tiers = sorted(tiers)
+        self.floors = array("q", [_to_minor(minimum) for minimum, _ in tiers])
+        # Daily rates as exact fractions so no float ever touches a balance.
+        ratios = [rate.as_integer_ratio() for _, rate in tiers]
+        self.numerators = array("q", [numerator for numerator, _ in ratios])
+        self.denominators = array("q", [denominator * DAYS_PER_YEAR for _, denominator in ratios])
+
+    @classmethod
+    def from_config(cls, config: str) -> "RateTable":
+        if not config:
+            raise ValueError("INTEREST_RATE_TIERS is not configured")
+        return cls([(Decimal(minimum), Decimal(rate)) for minimum, rate in json.loads(config)])
+
+    def accrue(self, balances: array, carries: array) -> Tuple[array, array]:
+        posted = array("q", bytes(8 * len(balances)))
+        carried = array("q", carries)
+        floors, numerators, denominators = self.floors, self.numerators, self.denominators
+
+        for index, balance in enumerate(balances):
+            tier = bisect.bisect_right(floors, balance) - 1
+            if tier < 0 or balance <= 0:
+                continue
+            units = balance * CARRY_SCALE * numerators[tier] // denominators[tier] + carries[index]
+            posted[index], carried[index] = divmod(units, CARRY_SCALE)
+        return posted, carried
+
+
+async def _post_batch(accounts: List[dict], rates: RateTable, accrual_date: datetime, run_id: str, shard_index: int, report: dict):
+    balances = array("q", [_to_minor(balance_of(account)) for account in accounts])
+    carries = array("q", [account.get("interest_carry", 0) for account in accounts])
+    posted, carried = rates.accrue(balances, carries)
+
+    updates = []
+    entries = []
+    for index, account in enumerate(accounts):
+        update = {"$set": {"interest_carry": carried[index], "interest_accrued_through": accrual_date}}
+        if posted[index]:
+            amount = _from_minor(posted[index])
+            # The kobo column is truncated for the rate maths; the leg records
+            # the stored balance exactly.
+            balance_before = balance_of(account)
+            update["$inc"] = {"balance": amount}
+            update["$currentDate"] = {"updated_at": True}
+            entries.append(JournalEntry(
+                transaction_type="interest",
+                amount=amount,
+                description=f"Interest for {accrual_date:%Y-%m-%d}",
+                legs=[JournalLeg(
+                    account_id=str(account["_id"]),
+                    direction="credit",
+                    balance_before=balance_before,
+                    balance_after=balance_before + amount
+                )]
+            ))
+        # Matching the balance we computed from keeps ledger balances exact if
+        # the account moved after it was read.
+        updates.append(UpdateOne(
+            {"_id": account["_id"], "balance": account.get("balance"), "interest_accrued_through": {"$ne": accrual_date}},
+            update
+        ))
+
+    async def _post(session):
+        result = await accounts_collection.bulk_write(updates, ordered=False, session=session)
+        if result.matched_count != len(updates):
+            raise StaleBatch()
+
+        if entries:
+            inserted = await transactions_collection.insert_many(
+                [entry.dict(exclude={'id'}) for entry in entries],
+                session=session
+            )
+            for entry, inserted_id in zip(entries, inserted.inserted_ids):
+                entry.id = str(inserted_id)
+            await record_rollups(
+                [transaction_from_entry({**entry.dict(), "_id": entry.id}, entry.legs[0].account_id) for entry in entries],
+                session=session
+            )
+
+        await counters_collection.update_one(
+            {"_id": run_id},
+            {"$set": {f"shards.{shard_index}.last_id": accounts[-1]["_id"]}},
+            session=session
+        )
+
+    await run_transaction(_post, "interest_accrual")
+    report["accounts"] += len(accounts)
+    report["credited"] += len(entries)
+    report["interest_total"] += sum((entry.amount for entry in entries), Decimal("0"))
+
+async def _accrue_batch(accounts: List[dict], rates: RateTable, accrual_date: datetime, run_id: str, shard_index: int, report: dict):
+    for _ in range(INTEREST_BATCH_ATTEMPTS):
+        try:
+            await _post_batch(accounts, rates, accrual_date, run_id, shard_index, report)
+            return
+        except StaleBatch:
+            report["retried_batches"] += 1
+            accounts = await accounts_collection.find(
+                {
+                    "_id": {"$in": [account["_id"] for account in accounts]},
+                    "interest_accrued_through": {"$ne": accrual_date}
+                },
+                {"balance": 1, "interest_carry": 1}
+            ).sort("_id", 1).to_list(length=None)
+            if not accounts:
+                return
+    raise RuntimeError(f"Accounts in shard {shard_index} kept changing during accrual; rerun to resume")
+
+async def _accrue_shard(run_id: str, shard_index: int, shard: dict, rates: RateTable, accrual_date: datetime, batch_size: int, report: dict):
+    if shard.get("done"):
+        return
+
+    bounds = {"$gte": shard["min_id"], "$lte" if shard["last"] else "$lt": shard["max_id"]}
+    if shard.get("last_id") is not None:
+        bounds["$gt"] = shard["last_id"]
+    cursor = accounts_collection.find(
+        {"_id": bounds, "account_type": "savings", "interest_accrued_through": {"$ne": accrual_date}},
+        {"balance": 1, "interest_carry": 1},
+        batch_size=batch_size
+    ).sort("_id", 1)
+
+    chunk = []
+    async for account in cursor:
+        chunk.append(account)
+        if len(chunk) >= batch_size:
+            await _accrue_batch(chunk, rates, accrual_date, run_id, shard_index, report)
+            chunk = []
+    if chunk:
+        await _accrue_batch(chunk, rates, accrual_date, run_id, shard_index, report)
+
+    await counters_collection.update_one({"_id": run_id}, {"$set": {f"shards.{shard_index}.done": True}})
+
+async def _load_run(run_id: str, accrual_date: datetime, shards: int) -> dict:
+    run = await counters_collection.find_one({"_id": run_id})
+    if run is None:
+        # Shard bounds are fixed on the first attempt so a resumed run scans the same ranges.
+        run = {
+            "_id": run_id,
+            "accrual_date": accrual_date,
+            "started_at": datetime.utcnow(),
+            "shards": [
+                {
+                    "min_id": bounds["$gte"],
+                    "max_id": bounds.get("$lt", bounds.get("$lte")),
+                    "last": "$lte" in bounds,
+                    "last_id": None,
+                    "done": False
+                }
+                for bounds in await shard_bounds(shards)
+            ],
+        }
+        await counters_collection.update_one({"_id": run_id}, {"$setOnInsert": run}, upsert=True)
+        run = await counters_collection.find_one({"_id": run_id})
+    return run
+
+async def accrue_interest(
+        accrual_date: Optional[datetime] = None,
+        rates: Optional[RateTable] = None,
+        shards: int = INTEREST_SHARDS,
+        batch_size: int = INTEREST_BATCH_SIZE
+) -> dict:
+    started = time.monotonic()
+    if accrual_date is None:
+        accrual_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    rates = rates or RateTable.from_config(INTEREST_RATE_TIERS)
+    run_id = f"interest:{accrual_date:%Y-%m-%d}"
+    run = await _load_run(run_id, accrual_date, shards)
+
+    report = {"accrual_date": accrual_date.date().isoformat(), "accounts": 0, "credited": 0, "retried_batches": 0, "interest_total": Decimal("0")}
+    await asyncio.gather(*(
+        _accrue_shard(run_id, index, shard, rates, accrual_date, batch_size, report)
+        for index, shard in enumerate(run["shards"])
+    ))
+    await counters_collection.update_one({"_id": run_id}, {"$set": {"finished_at": datetime.utcnow()}})
+
+    seconds = time.monotonic() - started
+    report["interest_total"] = str(report["interest_total"])
+    report["seconds"] = seconds
+    report["accounts_per_second"] = report["accounts"] / seconds if seconds else 0
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accrue and post one day of interest on savings accounts")
+    parser.add_argument("--date", type=datetime.fromisoformat, help="day to accrue (default: yesterday, UTC)")
+    parser.add_argument("--rates", default=INTEREST_RATE_TIERS, help="JSON list of [minimum balance, annual rate] tiers")
+    parser.add_argument("--shards", type=int, default=INTEREST_SHARDS)
+    parser.add_argument("--batch-size", type=int, default=INTEREST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    report = asyncio.run(accrue_interest(args.date, RateTable.from_config(args.rates), args.shards, args.batch_size))
+    print(json.dumps(report, indent=2))
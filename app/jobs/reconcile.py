@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional
+from pymongo import UpdateOne
+
+from ..database import accounts_collection, transactions_collection, checkpoints_collection
+from ..core.codecs import to_decimal
+from ..services.balance import balance_of
+from ..services.archive import archive_union, archived_months, next_month
+from .rollups import INFLOW, LEG_ROWS
+
+
+RECONCILE_SHARDS = 8
+RECONCILE_CHUNK_SIZE = 2000
+# Accounts written to within this window may have ledger rows still in flight.
+RECONCILE_SETTLE_SECONDS = 60
+
+SIGNED_AMOUNT = {"$cond": [INFLOW, {"$toDecimal": "$amount"}, {"$multiply": [{"$toDecimal": "$amount"}, -1]}]}
+
+
+async def shard_bounds(shards: int) -> List[dict]:
+    buckets = await accounts_collection.aggregate([
+        {"$bucketAuto": {"groupBy": "$_id", "buckets": shards}}
+    ]).to_list(length=None)
+    return [
+        {"$gte": bucket["_id"]["min"], "$lte" if index == len(buckets) - 1 else "$lt": bucket["_id"]["max"]}
+        for index, bucket in enumerate(buckets)
+    ]
+
+async def _reconcile_chunk(accounts: List[dict], cutoff: datetime, report: dict):
+    account_ids = [str(account["_id"]) for account in accounts]
+    checkpoints = {
+        checkpoint["_id"]: checkpoint
+        async for checkpoint in checkpoints_collection.find({"_id": {"$in": account_ids}})
+    }
+
+    branches = []
+    for account_id in account_ids:
+        checkpoint = checkpoints.get(account_id)
+        branch = {"account_id": account_id, "timestamp": {"$lte": cutoff}}
+        if checkpoint:
+            branch["timestamp"]["$gt"] = checkpoint["as_of"]
+        branches.append(branch)
+
+    # Archive months only matter for accounts whose checkpoint predates them.
+    floors = [checkpoints[account_id]["as_of"] if account_id in checkpoints else None for account_id in account_ids]
+    months = [
+        month for month in await archived_months()
+        if any(floor is None or next_month(month) > floor for floor in floors)
+    ]
+
+    leg_branches = [{"legs.account_id": branch["account_id"], "timestamp": branch["timestamp"]} for branch in branches]
+    match = {"$match": {"$or": branches + leg_branches, "status": "completed"}}
+    deltas = {}
+    async for group in transactions_collection.aggregate([
+        match,
+        *archive_union(months, [match]),
+        *LEG_ROWS,
+        # Drop the counterparty legs of transfers that belong to other chunks.
+        {"$match": {"$or": branches}},
+        {"$group": {"_id": "$account_id", "delta": {"$sum": SIGNED_AMOUNT}, "rows": {"$sum": 1}}}
+    ]):
+        deltas[group["_id"]] = group
+        report["ledger_rows"] += group["rows"]
+
+    updates = []
+    for account in accounts:
+        account_id = str(account["_id"])
+        if account.get("updated_at") and account["updated_at"] > cutoff:
+            report["skipped_active"] += 1
+            continue
+
+        checkpoint = checkpoints.get(account_id)
+        group = deltas.get(account_id)
+        expected = to_decimal(checkpoint["balance"]) if checkpoint else Decimal("0")
+        if group:
+            expected += to_decimal(group["delta"])
+        actual = balance_of(account)
+        report["accounts_checked"] += 1
+
+        if expected != actual:
+            report["mismatches"].append({"account_id": account_id, "expected": str(expected), "actual": str(actual)})
+            continue
+
+        if group or not checkpoint:
+            updates.append(UpdateOne(
+                {"_id": account_id},
+                {"$set": {"balance": actual, "as_of": cutoff, "checked_at": datetime.utcnow()}},
+                upsert=True
+            ))
+
+    if updates:
+        await checkpoints_collection.bulk_write(updates, ordered=False)
+
+async def _reconcile_shard(bounds: dict, cutoff: datetime, report: dict):
+    chunk = []
+    cursor = accounts_collection.find(
+        {"_id": bounds},
+        {"balance": 1, "updated_at": 1},
+        batch_size=RECONCILE_CHUNK_SIZE
+    ).sort("_id", 1)
+    async for account in cursor:
+        chunk.append(account)
+        if len(chunk) >= RECONCILE_CHUNK_SIZE:
+            await _reconcile_chunk(chunk, cutoff, report)
+            chunk = []
+    if chunk:
+        await _reconcile_chunk(chunk, cutoff, report)
+
+async def reconcile_balances(shards: int = RECONCILE_SHARDS, settle_seconds: Optional[int] = None) -> dict:
+    started = time.monotonic()
+    cutoff = datetime.utcnow() - timedelta(seconds=RECONCILE_SETTLE_SECONDS if settle_seconds is None else settle_seconds)
+    report = {
+        "cutoff": cutoff.isoformat(),
+        "accounts_checked": 0,
+        "ledger_rows": 0,
+        "skipped_active": 0,
+        "mismatches": [],
+    }
+
+    await asyncio.gather(*(_reconcile_shard(bounds, cutoff, report) for bounds in await shard_bounds(shards)))
+
+    seconds = time.monotonic() - started
+    report["seconds"] = seconds
+    report["accounts_per_second"] = report["accounts_checked"] / seconds if seconds else 0
+    report["rows_per_second"] = report["ledger_rows"] / seconds if seconds else 0
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check account balances against the ledger since the last checkpoint")
+    parser.add_argument("--shards", type=int, default=RECONCILE_SHARDS)
+    parser.add_argument("--settle-seconds", type=int, default=RECONCILE_SETTLE_SECONDS)
+    args = parser.parse_args()
+
+    report = asyncio.run(reconcile_balances(args.shards, args.settle_seconds))
+    print(json.dumps(report, indent=2))
+    if report["mismatches"]:
+        raise SystemExit(1)
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional, Sequence
+
+from ..database import transactions_collection, rollups_collection
+from ..services.rollup import ROLLUP_PERIODS
+from ..services.archive import archive_union, archived_months
+
+
+INFLOW = {
+    "$or": [
+        {"$in": ["$transaction_type", ["deposit", "interest"]]},
+        {"$and": [
+            {"$eq": ["$transaction_type", "transfer"]},
+            {"$gt": ["$balance_after", "$balance_before"]}
+        ]}
+    ]
+}
+
+# Expands journal entries into one row per leg, shaped like a legacy ledger
+# row (which passes through as its own single leg).
+LEG_ROWS = [
+    {"$addFields": {"legs": {"$ifNull": ["$legs", [{
+        "account_id": "$account_id",
+        "balance_before": "$balance_before",
+        "balance_after": "$balance_after"
+    }]]}}},
+    {"$unwind": "$legs"},
+    {"$addFields": {
+        "account_id": "$legs.account_id",
+        "balance_before": "$legs.balance_before",
+        "balance_after": "$legs.balance_after"
+    }},
+]
+
+
+def rollup_pipeline(period: str, account_id: Optional[str] = None, archive_months: Sequence[datetime] = ()) -> list:
+    match = {"status": "completed"}
+    if account_id:
+        match["$or"] = [{"legs.account_id": account_id}, {"account_id": account_id}]
+
+    return [
+        {"$match": match},
+        *archive_union(archive_months, [{"$match": match}]),
+        *LEG_ROWS,
+        *([{"$match": {"account_id": account_id}}] if account_id else []),
+        {"$group": {
+            "_id": {
+                "account_id": "$account_id",
+                "bucket_start": {"$dateTrunc": {"date": "$timestamp", "unit": period}}
+            },
+            "inflow": {"$sum": {"$cond": [INFLOW, {"$toDecimal": "$amount"}, {"$toDecimal": 0}]}},
+            "outflow": {"$sum": {"$cond": [INFLOW, {"$toDecimal": 0}, {"$toDecimal": "$amount"}]}},
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "account_id": "$_id.account_id",
+            "period": period,
+            "bucket_start": "$_id.bucket_start",
+            "inflow": 1,
+            "outflow": 1,
+            "count": 1
+        }},
+        {"$merge": {
+            "into": rollups_collection.name,
+            "on": ["account_id", "period", "bucket_start"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+async def rebuild_rollups(account_id: Optional[str] = None) -> dict:
+    started = time.monotonic()
+    scope = {"account_id": account_id} if account_id else {}
+    await rollups_collection.delete_many(scope)
+
+    months = await archived_months()
+    for period in ROLLUP_PERIODS:
+        await transactions_collection.aggregate(rollup_pipeline(period, account_id, months), allowDiskUse=True).to_list(length=None)
+
+    return {
+        "buckets": await rollups_collection.count_documents(scope),
+        "seconds": time.monotonic() - started,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute account rollups from the transaction ledger")
+    parser.add_argument("--account-id", help="only rebuild this account")
+    args = parser.parse_args()
+
+    result = asyncio.run(rebuild_rollups(args.account_id))
+    print(f"rebuilt {result['buckets']} buckets in {result['seconds']:.2f}s")
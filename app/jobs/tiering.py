@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Set
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure
+
+from ..database import db, transactions_collection, counters_collection
+from ..indexes import ARCHIVE_INDEXES
+from ..services.archive import (
+    ARCHIVE_STATE_ID, ARCHIVE_STATE_TTL_SECONDS, archive_collection, archive_collection_name, archived_months, month_start
+)
+
+
+TRANSACTION_HOT_DAYS = int(os.getenv("TRANSACTION_HOT_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+ARCHIVE_BLOCK_COMPRESSOR = os.getenv("ARCHIVE_BLOCK_COMPRESSOR", "zstd")
+
+DUPLICATE_KEY = 11000
+NAMESPACE_EXISTS = 48
+
+
+async def ensure_archive(month: datetime):
+    try:
+        await db.create_collection(
+            archive_collection_name(month),
+            storageEngine={"wiredTiger": {"configString": f"block_compressor={ARCHIVE_BLOCK_COMPRESSOR}"}}
+        )
+    except CollectionInvalid:
+        pass
+    except OperationFailure as e:
+        if e.code != NAMESPACE_EXISTS:
+            raise
+    await archive_collection(month).create_indexes(ARCHIVE_INDEXES)
+
+async def register_months(cutoff: datetime, known: Set[datetime]) -> Set[datetime]:
+    groups = await transactions_collection.aggregate([
+        {"$match": {"timestamp": {"$lt": cutoff}}},
+        {"$group": {"_id": {"$dateTrunc": {"date": "$timestamp", "unit": "month"}}}}
+    ]).to_list(length=None)
+    months = {group["_id"] for group in groups} - known
+
+    for month in sorted(months):
+        await ensure_archive(month)
+    await counters_collection.update_one(
+        {"_id": ARCHIVE_STATE_ID},
+        {
+            "$addToSet": {"months": {"$each": sorted(months)}},
+            "$max": {"archived_before": cutoff}
+        },
+        upsert=True
+    )
+    return months
+
+async def _archive_batch(documents: list):
+    by_month = {}
+    for document in documents:
+        by_month.setdefault(month_start(document["timestamp"]), []).append(document)
+
+    for month, rows in by_month.items():
+        try:
+            await archive_collection(month).insert_many(rows, ordered=False)
+        except BulkWriteError as e:
+            # Rows copied by an interrupted earlier run are already archived.
+            if any(error["code"] != DUPLICATE_KEY for error in e.details["writeErrors"]):
+                raise
+
+    await transactions_collection.delete_many({"_id": {"$in": [document["_id"] for document in documents]}})
+
+async def archive_transactions(hot_days: int = TRANSACTION_HOT_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    started = time.monotonic()
+    cutoff = datetime.utcnow() - timedelta(days=hot_days)
+
+    known = set(await archived_months())
+    new_months = await register_months(cutoff, known)
+    if new_months:
+        # History queries cache the month list; let every worker see the new
+        # months before their rows leave the hot collection.
+        await asyncio.sleep(ARCHIVE_STATE_TTL_SECONDS)
+    known |= new_months
+
+    moved = 0
+    while True:
+        documents = await transactions_collection.find(
+            {"timestamp": {"$lt": cutoff}}
+        ).sort([("timestamp", 1), ("_id", 1)]).limit(batch_size).to_list(length=batch_size)
+        if not documents:
+            break
+
+        late_months = {month_start(document["timestamp"]) for document in documents} - known
+        if late_months:
+            known |= await register_months(cutoff, known)
+            await asyncio.sleep(ARCHIVE_STATE_TTL_SECONDS)
+
+        await _archive_batch(documents)
+        moved += len(documents)
+
+    return {
+        "cutoff": cutoff.isoformat(),
+        "new_months": [archive_collection_name(month) for month in sorted(new_months)],
+        "moved": moved,
+        "hot_rows": await transactions_collection.estimated_document_count(),
+        "seconds": time.monotonic() - started,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old transactions into monthly archive collections")
+    parser.add_argument("--hot-days", type=int, default=TRANSACTION_HOT_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(archive_transactions(args.hot_days, args.batch_size)), indent=2))
@@ -1,36 +1,107 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import time
 
 from .api.routes.auth import router as auth_router
 from .api.routes.account import router as account_router
 from .api.routes.transaction import router as transaction_router
+from .core.outbox import email_outbox_worker
+from .services.stream import stream_hub, CHANGE_STREAMS
+from .core.security import principal_cache, password_hasher
+from .core.consistency import begin_request, encode_token, CAUSAL_TOKEN_HEADER, SECONDARY_READS
+from .core.metrics import registry, Gauge, observe_request, start_request_logging, stop_request_logging
+from .database import db
+from .indexes import ensure_indexes, verify_index_usage, INDEX_CHECK_ON_STARTUP
 
 
-app = FastAPI()
+startup_timings = {"startup_seconds": 0.0, "warm_up_seconds": 0.0}
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+registry.register(Gauge("principal_cache_hits", "Principal cache hits", lambda: principal_cache.hits))
+registry.register(Gauge("principal_cache_misses", "Principal cache misses", lambda: principal_cache.misses))
+registry.register(Gauge("password_hash_queued", "bcrypt operations waiting for a worker", lambda: password_hasher.queued))
+registry.register(Gauge("password_hash_in_flight", "bcrypt operations running", lambda: password_hasher.in_flight))
+registry.register(Gauge("email_outbox_sent", "Emails delivered by this worker", lambda: email_outbox_worker.sent))
+registry.register(Gauge("email_outbox_failed", "Emails given up on by this worker", lambda: email_outbox_worker.failed))
+registry.register(Gauge("email_outbox_errors", "Outbox batches that failed with an error on this worker", lambda: email_outbox_worker.errors))
+registry.register(Gauge("stream_subscribers", "Open /account/stream connections", lambda: stream_hub.subscribers))
+registry.register(Gauge("stream_events_delivered", "Change events pushed to stream subscribers", lambda: stream_hub.delivered))
+registry.register(Gauge("stream_subscribers_lagged", "Stream subscribers disconnected for falling behind", lambda: stream_hub.lagged))
+registry.register(Gauge("app_startup_seconds", "Time spent in application startup", lambda: startup_timings["startup_seconds"]))
+registry.register(Gauge("mongo_warm_up_seconds", "Time spent opening the MongoDB connection pool", lambda: startup_timings["warm_up_seconds"]))
 
-@app.middleware("http")
-async def log_middleware(request: Request, call_next):
-    start_time = time.time()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    start_request_logging()
+    db.connect()
+    await db.warm_up()
+    startup_timings["warm_up_seconds"] = time.perf_counter() - started
+
+    await ensure_indexes()
+    if INDEX_CHECK_ON_STARTUP:
+        await verify_index_usage()
+    email_outbox_worker.start()
+    if CHANGE_STREAMS:
+        stream_hub.start()
+    startup_timings["startup_seconds"] = time.perf_counter() - started
+
+    try:
+        yield
+    finally:
+        await stream_hub.stop()
+        await email_outbox_worker.stop()
+        stop_request_logging()
+        db.close()
+
+
+async def metrics_middleware(request: Request, call_next):
+    start_time = time.perf_counter()
     response = await call_next(request)
-    end_time = time.time()
+    duration = time.perf_counter() - start_time
 
-    duration = end_time - start_time
-    print(f"Request: {request.method} {request.url} | Duration: {duration:.4f} seconds")
+    route = request.scope.get("route")
+    observe_request(request.method, route.path if route else "unmatched", response.status_code, duration)
     return response
 
-app.include_router(auth_router)
-app.include_router(account_router)
-app.include_router(transaction_router)
+async def causal_consistency_middleware(request: Request, call_next):
+    state = begin_request(request.headers.get(CAUSAL_TOKEN_HEADER))
+    response = await call_next(request)
+    if state["written"]:
+        response.headers[CAUSAL_TOKEN_HEADER] = encode_token(state["written"])
+    return response
 
-@app.get('/')
 def home():
-    return {"message": "Welcome to UserMoney"}
\ No newline at end of file
+    return {"message": "Welcome to UserMoney"}
+
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[CAUSAL_TOKEN_HEADER],
+    )
+    if SECONDARY_READS:
+        app.middleware("http")(causal_consistency_middleware)
+    app.middleware("http")(metrics_middleware)
+
+    app.include_router(auth_router)
+    app.include_router(account_router)
+    app.include_router(transaction_router)
+
+    app.get('/')(home)
+    app.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)(metrics)
+    return app
+
+
+app = create_app()
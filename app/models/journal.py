@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import List, Literal, Optional
+from bson import ObjectId
+from pydantic import BaseModel, Field, ConfigDict
+from decimal import Decimal
+
+
+class JournalLeg(BaseModel):
+    account_id: str
+    direction: Literal["debit", "credit"]
+    balance_before: Decimal
+    balance_after: Decimal
+    description: Optional[str] = None
+
+
+class JournalEntry(BaseModel):
+    id: str = None
+    transaction_type: Literal["deposit", "withdrawal", "transfer", "interest"]
+    amount: Decimal
+    description: Optional[str] = None
+    legs: List[JournalLeg]
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    status: Literal["pending", "completed", "failed"] = "completed"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    model_config = ConfigDict(
+        populate_by_name=True,
+        arbitrary_types_allowed=True,
+        json_encoders = {ObjectId: str}
+    )
@@ -0,0 +1,51 @@
+from bson.decimal128 import Decimal128
+
+from ..core.codecs import to_decimal
+from .account import Account
+from .transaction import Transaction
+from .user import User
+
+
+# Money fields arrive as Decimal128 and are converted in place before
+# model_validate; pydantic-core validation measured faster than building the
+# models with model_construct in Python.
+TRANSACTION_DECIMAL_FIELDS = ("amount", "balance_before", "balance_after")
+
+def account_from_document(document: dict) -> Account:
+    document["id"] = str(document.pop("_id"))
+    if document.get("balance") is not None:
+        document["balance"] = to_decimal(document["balance"])
+    return Account.model_validate(document)
+
+def transaction_from_document(document: dict) -> Transaction:
+    document["id"] = str(document.pop("_id"))
+    for field in TRANSACTION_DECIMAL_FIELDS:
+        value = document.get(field)
+        if value.__class__ is Decimal128:
+            document[field] = value.to_decimal()
+    return Transaction.model_validate(document)
+
+def ledger_row(document: dict, account_id: str) -> dict:
+    # Journal entries carry one leg per account; flatten the caller's leg into
+    # the per-account row shape that legacy ledger documents already have.
+    legs = document.pop("legs", None)
+    if legs is None:
+        return document
+
+    for leg in legs:
+        if leg["account_id"] == account_id:
+            document["account_id"] = account_id
+            document["balance_before"] = leg["balance_before"]
+            document["balance_after"] = leg["balance_after"]
+            if leg.get("description"):
+                document["description"] = leg["description"]
+        else:
+            document["recipient_account_id"] = leg["account_id"]
+    return document
+
+def transaction_from_entry(document: dict, account_id: str) -> Transaction:
+    return transaction_from_document(ledger_row(document, account_id))
+
+def user_from_document(document: dict) -> User:
+    document["id"] = str(document.pop("_id"))
+    return User.model_validate(document)
@@ -8,7 +8,7 @@ from decimal import Decimal
 class Transaction(BaseModel):
     id: str = None
     account_id: str
-    transaction_type: Literal["deposit", "withdrawal", "transfer"]
+    transaction_type: Literal["deposit", "withdrawal", "transfer", "interest"]
     amount: Decimal
     description: Optional[str] = None
     balance_before: Decimal
@@ -16,7 +16,7 @@ class Transaction(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     status: Literal["pending", "completed", "failed"] = "pending"
     recipient_account_id: Optional[str] = None
-    created_at: datetime = datetime.utcnow()
+    created_at: datetime = Field(default_factory=datetime.utcnow)
     
     model_config = ConfigDict(
         populate_by_name=True,
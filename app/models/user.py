@@ -15,6 +15,7 @@ class User(BaseModel):
     reset_token: Optional[str] = None
     reset_token_expires: Optional[datetime] = None
     bvn: Optional[str] = None
+    token_epoch: int = 0
     phone_number: str 
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, validator
-from typing import Literal
+from typing import List, Literal
+from datetime import datetime
+from decimal import Decimal
 
 
 class CreateAccount(BaseModel):
@@ -10,4 +12,24 @@ class CreateAccount(BaseModel):
     def validate_bvn(cls, v):
         if len(v) != 11 or not v.isdigit():
             raise ValueError("BVN must be exactly 11 digits")
-        return v
\ No newline at end of file
+        return v
+
+
+class BalanceResponse(BaseModel):
+    balance: Decimal
+
+
+class RollupBucket(BaseModel):
+    bucket_start: datetime
+    inflow: Decimal
+    outflow: Decimal
+    count: int
+
+
+class AccountSummary(BaseModel):
+    account_id: str
+    period: Literal["day", "month"]
+    buckets: List[RollupBucket]
+    total_inflow: Decimal
+    total_outflow: Decimal
+    total_count: int
\ No newline at end of file
@@ -1,7 +1,9 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List, Literal
 from decimal import Decimal
 
+from ..models.transaction import Transaction
+
 
 class TransactionRequest(BaseModel):
     amount: Decimal = Field(..., gt=0)
@@ -11,4 +13,28 @@ class TransactionRequest(BaseModel):
 class TransferRequest(BaseModel):
     to_account_number: str = Field(..., min_length=10, max_length=10)
     amount: Decimal = Field(..., gt=0)
-    description: Optional[str] = None
\ No newline at end of file
+    description: Optional[str] = None
+
+class BatchTransferRequest(BaseModel):
+    transfers: List[TransferRequest] = Field(..., min_length=1, max_length=10000)
+
+
+class BatchTransferItemResult(BaseModel):
+    index: int
+    to_account_number: str
+    amount: Decimal
+    status: Literal["completed", "failed"]
+    transaction_id: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class BatchTransferResult(BaseModel):
+    succeeded: int
+    failed: int
+    total_amount: Decimal
+    results: List[BatchTransferItemResult]
+
+
+class TransactionPage(BaseModel):
+    items: List[Transaction]
+    next_cursor: Optional[str] = None
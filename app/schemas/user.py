@@ -21,4 +21,17 @@ class NewPassword(BaseModel):
 
 class Token(BaseModel):
     access_token: str
-    token_type: str = "bearer"
\ No newline at end of file
+    token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class Principal(BaseModel):
+    user_id: str
+    email: EmailStr
+    is_verified: bool = False
+    account_id: Optional[str] = None
\ No newline at end of file
@@ -1,23 +1,85 @@
 from fastapi import HTTPException, status, Depends
-from typing import Literal
+from typing import Literal, Optional
 from datetime import datetime
+from decimal import Decimal
 from bson import ObjectId
-from bson.decimal128 import Decimal128
-import random
-import string
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import os
 
-from ..database import accounts_collection, users_collection
+from ..database import accounts_collection, users_collection, counters_collection
 from ..models.user import User
 from ..services.auth import get_current_user
 from ..models.account import Account
+from ..models.mapping import account_from_document
+from .balance import balance_of
+from ..core.security import principal_cache
+from ..core.consistency import reader, read_session, write_session
 
-async def generate_account_number() -> str:
-    while True:
-        account_number = ''.join(random.choices(string.digits, k=10))
 
-        existing = await accounts_collection.find_one({"account_number": account_number})
-        if not existing:
-            return account_number
+ACCOUNT_NUMBER_BLOCK_SIZE = int(os.getenv("ACCOUNT_NUMBER_BLOCK_SIZE", "100"))
+ACCOUNT_NUMBER_CHECK_DIGIT = os.getenv("ACCOUNT_NUMBER_CHECK_DIGIT", "true").lower() == "true"
+ACCOUNT_NUMBER_START = int(os.getenv("ACCOUNT_NUMBER_START", "100000000"))
+ACCOUNT_NUMBER_MAX_ATTEMPTS = 5
+
+
+def luhn_check_digit(digits: str) -> str:
+    total = 0
+    for position, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if position % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+class AccountNumberAllocator:
+    def __init__(self, collection=counters_collection, block_size: int = ACCOUNT_NUMBER_BLOCK_SIZE,
+                 check_digit: bool = ACCOUNT_NUMBER_CHECK_DIGIT, start: int = ACCOUNT_NUMBER_START):
+        self.collection = collection
+        self.block_size = block_size
+        self.check_digit = check_digit
+        self.start = start
+        self.digits = 9 if check_digit else 10
+        self.blocks_reserved = 0
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def _reserve_block(self):
+        counter = await self.collection.find_one_and_update(
+            {"_id": "account_number"},
+            [{"$set": {"next": {"$add": [{"$ifNull": ["$next", self.start]}, self.block_size]}}}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._end = counter["next"]
+        self._next = self._end - self.block_size
+        self.blocks_reserved += 1
+
+    async def allocate(self) -> str:
+        async with self._lock:
+            if self._next >= self._end:
+                await self._reserve_block()
+            value = self._next
+            self._next += 1
+
+        if value >= 10 ** self.digits:
+            raise RuntimeError("Account number space exhausted")
+
+        number = f"{value:0{self.digits}d}"
+        if self.check_digit:
+            number += luhn_check_digit(number)
+        return number
+
+
+account_number_allocator = AccountNumberAllocator()
+
+async def generate_account_number() -> str:
+    return await account_number_allocator.allocate()
         
 async def create_account_for_user(
         bvn: str, 
@@ -32,6 +94,7 @@ async def create_account_for_user(
                 "$currentDate": {"updated_at": True}
             }
         )
+        principal_cache.invalidate(current_user.email)
     
     elif current_user.bvn != bvn:
         raise HTTPException(
@@ -39,45 +102,76 @@ async def create_account_for_user(
             detail="The BVN provided does not match your registered BVN."
         )
     
-    existing_account = await accounts_collection.find_one({
-        "user_id": str(current_user.id),
-        "account_type": account_type
-    })
-    
-    if existing_account:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"You already have a {account_type} account."
-        )
-    
     new_account = {
         "user_id": str(current_user.id),
         "account_type": account_type,
-        "account_number": await generate_account_number(),
-        "balance": 0.0,
+        "balance": Decimal("0.00"),
         "is_active": True,
         "currency": "NGN",
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
 
-    result = await accounts_collection.insert_one(new_account)
+    for _ in range(ACCOUNT_NUMBER_MAX_ATTEMPTS):
+        new_account.pop("_id", None)
+        new_account["account_number"] = await generate_account_number()
+        try:
+            async with write_session(current_user.id) as session:
+                result = await accounts_collection.insert_one(new_account, session=session)
+            break
+        except DuplicateKeyError as e:
+            if "account_number" not in (e.details or {}).get("keyPattern", {}):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"You already have a {account_type} account."
+                )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not allocate an account number"
+        )
+
     new_account["_id"] = str(result.inserted_id)
     return new_account
 
-async def get_user_account(user_id: str) -> Account:
-    account_data = await accounts_collection.find_one({"user_id": user_id})
+def _account_filter(user_id: str, account_id: Optional[str] = None) -> dict:
+    if account_id:
+        return {"_id": ObjectId(account_id), "user_id": user_id}
+    return {"user_id": user_id}
+
+async def get_user_account(user_id: str, account_id: Optional[str] = None) -> Account:
+    async with read_session(user_id) as session:
+        account_data = await reader(accounts_collection).find_one(_account_filter(user_id, account_id), session=session)
     if not account_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Account not found"
         )
     
-    if isinstance(account_data.get("balance"), Decimal128):
-        account_data["balance"] = account_data["balance"].to_decimal()
-    account_data['id'] = str(account_data['_id']) 
-    return Account(**account_data)
-
-async def get_user_balance(user_id: str) -> float:
-    account = await get_user_account(user_id)
-    return account.balance
\ No newline at end of file
+    return account_from_document(account_data)
+
+async def resolve_account_id(user_id: str, account_id: Optional[str] = None) -> str:
+    # The access token already carries the account id for most callers.
+    if account_id:
+        return account_id
+
+    async with read_session(user_id) as session:
+        account_data = await reader(accounts_collection).find_one({"user_id": user_id}, {"_id": 1}, session=session)
+    if not account_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Account not found"
+        )
+    return str(account_data["_id"])
+
+async def get_user_balance(user_id: str, account_id: Optional[str] = None) -> float:
+    async with read_session(user_id) as session:
+        account_data = await reader(accounts_collection).find_one(
+            _account_filter(user_id, account_id), {"balance": 1}, session=session
+        )
+    if not account_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Account not found"
+        )
+    return balance_of(account_data)
\ No newline at end of file
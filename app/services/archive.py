@@ -0,0 +1,117 @@
+import os
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Sequence
+
+from ..database import db, transactions_collection, counters_collection
+from ..core.cache import TTLCache
+from ..core.consistency import reader
+
+
+ARCHIVE_PREFIX = "transactions_archive_"
+ARCHIVE_STATE_ID = "transactions_archive"
+ARCHIVE_STATE_TTL_SECONDS = float(os.getenv("ARCHIVE_STATE_TTL_SECONDS", "60"))
+
+archive_state = TTLCache(maxsize=1, ttl=ARCHIVE_STATE_TTL_SECONDS)
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps and archive months are naive UTC; query parameters
+    # with an offset are converted so they can be compared with them.
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+def archive_collection_name(month: datetime) -> str:
+    return f"{ARCHIVE_PREFIX}{month:%Y_%m}"
+
+def archive_collection(month: datetime):
+    return db.get_collection(archive_collection_name(month))
+
+async def archive_status() -> dict:
+    status = archive_state.get(ARCHIVE_STATE_ID)
+    if status is None:
+        state = await counters_collection.find_one({"_id": ARCHIVE_STATE_ID}) or {}
+        status = {
+            "months": sorted(state.get("months", []), reverse=True),
+            "archived_before": state.get("archived_before")
+        }
+        archive_state.set(ARCHIVE_STATE_ID, status)
+    return status
+
+async def archived_months() -> List[datetime]:
+    return (await archive_status())["months"]
+
+async def history_sources(start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+    # The hot collection holds the newest rows, followed by archive months newest first.
+    sources = [transactions_collection]
+    for month in await archived_months():
+        if end is not None and month > end:
+            continue
+        if start is not None and next_month(month) <= start:
+            continue
+        sources.append(archive_collection(month))
+    return sources
+
+def archive_union(months: Sequence[datetime], pipeline: list) -> list:
+    return [{"$unionWith": {"coll": archive_collection_name(month), "pipeline": pipeline}} for month in months]
+
+async def find_history(
+        query: dict,
+        sort: list,
+        limit: int,
+        skip: int = 0,
+        session=None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+) -> List[dict]:
+    documents = []
+    seen = set()
+    for collection in await history_sources(start, end):
+        needed = limit - len(documents)
+        if needed <= 0:
+            break
+
+        source = reader(collection)
+        batch = await source.find(query, session=session).sort(sort).skip(skip).limit(needed).to_list(length=needed)
+        if batch:
+            skip = 0
+        elif skip:
+            skip -= await source.count_documents(query, session=session)
+
+        # A row can briefly exist in both tiers while the tiering job moves it.
+        for document in batch:
+            if document["_id"] not in seen:
+                seen.add(document["_id"])
+                documents.append(document)
+    return documents
+
+async def iterate_history(
+        query: dict,
+        sort: list,
+        projection: Optional[dict] = None,
+        batch_size: int = 0,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+) -> AsyncIterator[dict]:
+    sources = await history_sources(start, end)
+    in_flight = set()
+    archived_before = (await archive_status())["archived_before"]
+    if len(sources) > 1 and archived_before:
+        # Rows older than the boundary that are still hot are mid-move; read
+        # them from the hot collection only so a statement never repeats a row.
+        async for document in transactions_collection.find(
+            {"$and": [query, {"timestamp": {"$lt": archived_before}}]}, {"_id": 1}
+        ):
+            in_flight.add(document["_id"])
+
+    # Ascending scans read the oldest archive month first and the hot collection last.
+    for collection in reversed(sources):
+        async for document in collection.find(query, projection, batch_size=batch_size).sort(sort):
+            if collection is transactions_collection or document["_id"] not in in_flight:
+                yield document
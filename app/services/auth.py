@@ -6,10 +6,17 @@ from datetime import datetime, timedelta
 from jose import jwt, JWTError
 import secrets
 
+from bson import ObjectId
+
 from ..models.user import User
-from ..database import users_collection
+from ..models.mapping import user_from_document
+from ..schemas.user import Principal
+from ..database import users_collection, accounts_collection
 from ..core.email import send_verification_email, send_reset_email
-from ..core.security import get_password_hash, SECRET_KEY, ALGORITHM
+from ..core.security import (
+    get_password_hash_async, principal_cache, create_access_token, create_refresh_token,
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+)
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -21,7 +28,7 @@ async def create_user(email: EmailStr, password: str, full_name: str, phone_numb
                 detail="Email already registered"
             )
     
-    password_hash = get_password_hash(password)
+    password_hash = await get_password_hash_async(password)
     verification_token = secrets.token_urlsafe(32)
 
     new_user = User(
@@ -34,21 +41,16 @@ async def create_user(email: EmailStr, password: str, full_name: str, phone_numb
 
     await users_collection.insert_one(new_user.dict(exclude={'id'}))
 
-    try:
-        await send_verification_email(new_user.email, verification_token)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to send verification email: {str(e)}"
-        )
+    await send_verification_email(new_user.email, verification_token)
 
     return new_user.dict(exclude={"password_hash", "verification_token"})
 
 async def get_user_by_email(email: EmailStr) -> Optional[User]:
+    # Always the primary: user writes record no causal token, and a stale read
+    # here would be cached as the principal for the whole TTL.
     user_data = await users_collection.find_one({"email": email})
     if user_data:
-        user_data["id"] = str(user_data["_id"])
-        return User(**user_data)
+        return user_from_document(user_data)
     return None
 
 async def resend_verification_email(email: EmailStr):
@@ -97,6 +99,7 @@ async def generate_password_reset(email: EmailStr) -> bool:
             "$currentDate": {"updated_at": True}
         }
     )
+    principal_cache.invalidate(email)
 
     await send_reset_email(email, reset_token)
     return True
@@ -108,17 +111,20 @@ async def reset_user_password(reset_token: str,new_password: str) -> bool:
         })
 
     if user_data:
+        password_hash = await get_password_hash_async(new_password)
         await users_collection.update_one(
             {"_id": user_data["_id"]},
             {
                 "$set": {
-                    "password_hash": get_password_hash(new_password),
+                    "password_hash": password_hash,
                     "reset_token": None,
                     "reset_token_expires": None
                 },
+                "$inc": {"token_epoch": 1},
                 "$currentDate": {"updated_at": True}
             }
         )
+        principal_cache.invalidate(user_data["email"])
         return True
     return False
 
@@ -145,31 +151,86 @@ async def update_user(email: EmailStr, full_name: Optional[str], phone_number: O
                 "$currentDate": {"updated_at": True}
             }
         )
+        principal_cache.invalidate(user_data["email"])
     return {"detail": "User updated successfully"}
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+def _credentials_error(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _decode_token(token: str, token_type: str = "access") -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        if email is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
+        raise _credentials_error()
+
+    # Tokens issued before typed claims existed carry no "typ" and are access tokens.
+    if payload.get("sub") is None or payload.get("typ", "access") != token_type:
+        raise _credentials_error()
+    return payload
+
+def token_pair(user_id: str, email: str, token_epoch: int, is_verified: bool, account_id: Optional[str]) -> dict:
+    claims = {"sub": email, "uid": user_id, "epoch": token_epoch}
+    access_token = create_access_token({
+        **claims,
+        "typ": "access",
+        "ver": is_verified,
+        "acc": account_id
+    })
+    return {
+        "access_token": access_token,
+        "refresh_token": create_refresh_token(claims),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+async def issue_tokens(user: User) -> dict:
+    account = await accounts_collection.find_one({"user_id": user.id}, {"_id": 1})
+    return token_pair(user.id, user.email, user.token_epoch, user.is_verified, str(account["_id"]) if account else None)
+
+async def refresh_tokens(refresh_token: str) -> dict:
+    payload = _decode_token(refresh_token, token_type="refresh")
+    user = await get_user_by_email(payload["sub"])
+    if user is None or not user.is_active or user.token_epoch != payload.get("epoch"):
+        raise _credentials_error("Refresh token has been revoked")
+    return await issue_tokens(user)
+
+async def revoke_tokens(principal: Principal):
+    await users_collection.update_one(
+        {"_id": ObjectId(principal.user_id)},
+        {
+            "$inc": {"token_epoch": 1},
+            "$currentDate": {"updated_at": True}
+        }
+    )
+    principal_cache.invalidate(principal.email)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    email = _decode_token(token)["sub"]
+
+    user = principal_cache.get(email)
+    if user is not None:
+        return user
+
+    generation = principal_cache.generation(email)
     user = await get_user_by_email(email)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
+        raise _credentials_error("User not found")
+    principal_cache.set(email, user, generation)
+    return user
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    payload = _decode_token(token)
+    if payload.get("uid"):
+        return Principal(
+            user_id=payload["uid"],
+            email=payload["sub"],
+            is_verified=payload.get("ver", False),
+            account_id=payload.get("acc")
         )
-    return user
\ No newline at end of file
+
+    user = await get_current_user(token)
+    return Principal(user_id=user.id, email=user.email, is_verified=user.is_verified)
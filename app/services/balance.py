@@ -0,0 +1,32 @@
+from typing import Optional
+from decimal import Decimal
+from pymongo import ReturnDocument
+
+from ..core.codecs import to_decimal
+from ..database import accounts_collection
+
+
+async def credit_account(account_filter: dict, amount: Decimal, session=None) -> Optional[dict]:
+    return await accounts_collection.find_one_and_update(
+        account_filter,
+        {
+            "$inc": {"balance": amount},
+            "$currentDate": {"updated_at": True}
+        },
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+
+async def debit_account(account_filter: dict, amount: Decimal, session=None) -> Optional[dict]:
+    return await accounts_collection.find_one_and_update(
+        {**account_filter, "balance": {"$gte": amount}},
+        {
+            "$inc": {"balance": -amount},
+            "$currentDate": {"updated_at": True}
+        },
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+
+def balance_of(account_data: dict) -> Decimal:
+    return to_decimal(account_data.get("balance", 0))
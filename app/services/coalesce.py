@@ -0,0 +1,47 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+import asyncio
+
+
+class KeyedCoalescer:
+    def __init__(self, flush: Callable[[Hashable, List[Any]], Awaitable[List[Any]]], window_seconds: float, max_batch: int):
+        self.flush = flush
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.batches_flushed = 0
+        self.items_flushed = 0
+        self._pending: Dict[Hashable, list] = {}
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = []
+            asyncio.create_task(self._flush_after_window(key, batch))
+        batch.append((item, future))
+
+        if len(batch) >= self.max_batch:
+            del self._pending[key]
+            asyncio.create_task(self._flush(key, batch))
+
+        return await future
+
+    async def _flush_after_window(self, key: Hashable, batch: list):
+        await asyncio.sleep(self.window_seconds)
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+            await self._flush(key, batch)
+
+    async def _flush(self, key: Hashable, batch: list):
+        try:
+            results = await self.flush(key, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_flushed += 1
+        self.items_flushed += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
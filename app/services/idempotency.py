@@ -0,0 +1,146 @@
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from typing import Awaitable, Callable, Dict, Optional
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import hashlib
+import os
+
+from ..core.cache import TTLCache
+from ..database import idempotency_collection
+
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+idempotency_cache = TTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL_SECONDS)
+_in_flight: Dict[str, asyncio.Future] = {}
+
+
+def _fingerprint(operation: str, request: BaseModel) -> str:
+    return hashlib.sha256(f"{operation}:{request.model_dump_json()}".encode()).hexdigest()
+
+def _check_fingerprint(stored: dict, fingerprint: str):
+    if stored["fingerprint"] != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request"
+        )
+
+
+class IdempotencyKeyUsed(Exception):
+    def __init__(self, scoped_key: str):
+        super().__init__(scoped_key)
+        self.scoped_key = scoped_key
+
+
+class IdempotencyClaim:
+    def __init__(self, scoped_key: str, operation: str, fingerprint: str):
+        self.scoped_key = scoped_key
+        self.operation = operation
+        self.fingerprint = fingerprint
+
+    async def record(self, result: BaseModel, session):
+        # Inserted in the money movement's own transaction: the key exists
+        # exactly when the movement committed, with its response.
+        try:
+            await idempotency_collection.insert_one({
+                "_id": self.scoped_key,
+                "operation": self.operation,
+                "fingerprint": self.fingerprint,
+                "status": "completed",
+                "response": result.model_dump(mode="json"),
+                "created_at": datetime.utcnow()
+            }, session=session)
+        except DuplicateKeyError:
+            raise IdempotencyKeyUsed(self.scoped_key)
+
+
+async def _stored_response(claim: IdempotencyClaim) -> Optional[dict]:
+    stored = await idempotency_collection.find_one({"_id": claim.scoped_key})
+    if stored is None:
+        return None
+    _check_fingerprint(stored, claim.fingerprint)
+    idempotency_cache.set(claim.scoped_key, stored)
+    return stored["response"]
+
+async def _execute_once(claim: IdempotencyClaim, execute: Callable[[IdempotencyClaim], Awaitable[BaseModel]]) -> dict:
+    response = await _stored_response(claim)
+    if response is not None:
+        return response
+
+    try:
+        result = await execute(claim)
+    except IdempotencyKeyUsed as e:
+        if e.scoped_key != claim.scoped_key:
+            raise
+        # Another worker committed the same key first; its transaction won.
+        response = await _stored_response(claim)
+        if response is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Idempotency-Key was already used"
+            )
+        return response
+
+    response = result.model_dump(mode="json")
+    idempotency_cache.set(claim.scoped_key, {"fingerprint": claim.fingerprint, "response": response})
+    return response
+
+async def run_idempotent(
+        user_id: str,
+        idempotency_key: Optional[str],
+        operation: str,
+        request: BaseModel,
+        execute: Callable[[Optional[IdempotencyClaim]], Awaitable[BaseModel]]
+):
+    if idempotency_key is None:
+        return await execute(None)
+
+    if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be between 1 and {IDEMPOTENCY_KEY_MAX_LENGTH} characters"
+        )
+
+    scoped_key = f"{user_id}:{operation}:{idempotency_key}"
+    fingerprint = _fingerprint(operation, request)
+    claim = IdempotencyClaim(scoped_key, operation, fingerprint)
+
+    while True:
+        stored = idempotency_cache.get(scoped_key)
+        if stored is not None:
+            _check_fingerprint(stored, fingerprint)
+            return stored["response"]
+
+        pending = _in_flight.get(scoped_key)
+        if pending is None:
+            break
+        try:
+            stored = await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            # The request running this key was cancelled, not this one: take
+            # over the key instead of inheriting its cancellation.
+            if pending.cancelled():
+                continue
+            raise
+        _check_fingerprint(stored, fingerprint)
+        return stored["response"]
+
+    future = asyncio.get_running_loop().create_future()
+    future.add_done_callback(lambda done: done.cancelled() or done.exception())
+    _in_flight[scoped_key] = future
+    try:
+        response = await _execute_once(claim, execute)
+        future.set_result({"fingerprint": fingerprint, "response": response})
+        return response
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        del _in_flight[scoped_key]
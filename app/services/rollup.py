@@ -0,0 +1,95 @@
+from fastapi import HTTPException, status
+from typing import Dict, List, Literal, Optional, Tuple
+from datetime import datetime
+from decimal import Decimal
+from pymongo import UpdateOne
+
+from ..core.codecs import to_decimal
+from ..database import rollups_collection
+from ..models.transaction import Transaction
+from ..schemas.account import AccountSummary, RollupBucket
+from .account import resolve_account_id
+from .archive import naive_utc
+
+
+ROLLUP_PERIODS = ("day", "month")
+
+
+def bucket_start(timestamp: datetime, period: str) -> datetime:
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+def transaction_flow(transaction: Transaction) -> Tuple[Decimal, Decimal]:
+    if transaction.transaction_type in ("deposit", "interest"):
+        return transaction.amount, Decimal("0")
+    if transaction.transaction_type == "transfer" and transaction.balance_after > transaction.balance_before:
+        return transaction.amount, Decimal("0")
+    return Decimal("0"), transaction.amount
+
+def rollup_updates(transactions: List[Transaction]) -> List[UpdateOne]:
+    totals: Dict[tuple, list] = {}
+    for transaction in transactions:
+        inflow, outflow = transaction_flow(transaction)
+        for period in ROLLUP_PERIODS:
+            key = (transaction.account_id, period, bucket_start(transaction.timestamp, period))
+            total = totals.setdefault(key, [Decimal("0"), Decimal("0"), 0])
+            total[0] += inflow
+            total[1] += outflow
+            total[2] += 1
+
+    return [
+        UpdateOne(
+            {"account_id": account_id, "period": period, "bucket_start": start},
+            {"$inc": {"inflow": inflow, "outflow": outflow, "count": count}},
+            upsert=True
+        )
+        for (account_id, period, start), (inflow, outflow, count) in totals.items()
+    ]
+
+async def record_rollups(transactions: List[Transaction], session=None):
+    updates = rollup_updates(transactions)
+    if updates:
+        await rollups_collection.bulk_write(updates, ordered=False, session=session)
+
+async def get_user_summary(
+        user_id: str,
+        period: Literal["day", "month"] = "day",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        account_id: Optional[str] = None
+) -> AccountSummary:
+    start, end = naive_utc(start), naive_utc(end)
+    if start and end and start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    account_id = await resolve_account_id(user_id, account_id)
+
+    query = {"account_id": account_id, "period": period}
+    if start or end:
+        query["bucket_start"] = {}
+        if start:
+            query["bucket_start"]["$gte"] = bucket_start(start, period)
+        if end:
+            query["bucket_start"]["$lt"] = end
+
+    buckets = []
+    async for rollup in rollups_collection.find(query, {"_id": 0, "account_id": 0, "period": 0}).sort("bucket_start", 1):
+        buckets.append(RollupBucket(
+            bucket_start=rollup["bucket_start"],
+            inflow=to_decimal(rollup["inflow"]),
+            outflow=to_decimal(rollup["outflow"]),
+            count=rollup["count"]
+        ))
+
+    return AccountSummary(
+        account_id=account_id,
+        period=period,
+        buckets=buckets,
+        total_inflow=sum((bucket.inflow for bucket in buckets), Decimal("0")),
+        total_outflow=sum((bucket.outflow for bucket in buckets), Decimal("0")),
+        total_count=sum(bucket.count for bucket in buckets)
+    )
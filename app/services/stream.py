@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from pydantic import TypeAdapter
+from pymongo.errors import OperationFailure, PyMongoError
+
+from ..database import accounts_collection, transactions_collection
+from ..models.transaction import Transaction
+from ..models.mapping import transaction_from_entry
+from .account import get_user_balance
+
+
+CHANGE_STREAMS = os.getenv("CHANGE_STREAMS", "true").lower() == "true"
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+STREAM_BACKLOG_SIZE = int(os.getenv("STREAM_BACKLOG_SIZE", "50"))
+STREAM_BACKLOG_ACCOUNTS = int(os.getenv("STREAM_BACKLOG_ACCOUNTS", "10000"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+STREAM_RETRY_SECONDS = float(os.getenv("STREAM_RETRY_SECONDS", "1"))
+
+CHANGE_STREAM_HISTORY_LOST = 286
+CHANGE_STREAM_NOT_SUPPORTED = 40573
+
+ACCOUNT_CHANGES = [
+    {"$match": {"operationType": "update", "updateDescription.updatedFields.balance": {"$exists": True}}},
+    {"$project": {"documentKey": 1, "balance": "$updateDescription.updatedFields.balance"}}
+]
+TRANSACTION_CHANGES = [
+    {"$match": {"$or": [
+        {"operationType": "insert", "fullDocument.status": "completed"},
+        {"operationType": "update", "updateDescription.updatedFields.status": "completed"}
+    ]}},
+    {"$project": {"fullDocument": 1}}
+]
+
+transaction_adapter = TypeAdapter(Transaction)
+
+Event = Tuple[int, str, str]
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeStreamHub:
+    def __init__(
+            self,
+            queue_size: int = STREAM_QUEUE_SIZE,
+            backlog_size: int = STREAM_BACKLOG_SIZE,
+            backlog_accounts: int = STREAM_BACKLOG_ACCOUNTS
+    ):
+        self.queue_size = queue_size
+        self.backlog_size = backlog_size
+        self.backlog_accounts = backlog_accounts
+        self.epoch = secrets.token_hex(4)
+        self.sequence = 0
+        self.delivered = 0
+        self.lagged = 0
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # account_id -> [floor, events]; a client can resume from any event id >= floor.
+        self._backlog: "OrderedDict[str, list]" = OrderedDict()
+        self._resume_tokens: Dict[str, dict] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._watch(accounts_collection, ACCOUNT_CHANGES, self._account_change)),
+                asyncio.create_task(self._watch(
+                    transactions_collection, TRANSACTION_CHANGES, self._transaction_change, full_document="updateLookup"
+                ))
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _watch(self, collection, pipeline: list, handle, **options):
+        while True:
+            try:
+                async with collection.watch(
+                    pipeline, resume_after=self._resume_tokens.get(collection.name), **options
+                ) as stream:
+                    async for change in stream:
+                        self._resume_tokens[collection.name] = stream.resume_token
+                        handle(change)
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_NOT_SUPPORTED:
+                    logger.warning("Change streams unavailable, /account/stream is disabled: %s", e)
+                    return
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    self._resume_tokens.pop(collection.name, None)
+                logger.exception("Change stream on %s failed; resuming", collection.name)
+                await asyncio.sleep(STREAM_RETRY_SECONDS)
+            except PyMongoError:
+                logger.exception("Change stream on %s failed; resuming", collection.name)
+                await asyncio.sleep(STREAM_RETRY_SECONDS)
+
+    def _account_change(self, change: dict):
+        account_id = str(change["documentKey"]["_id"])
+        if account_id in self._backlog:
+            self._publish(account_id, "balance", json.dumps({
+                "account_id": account_id,
+                "balance": str(change["balance"])
+            }))
+
+    def _transaction_change(self, change: dict):
+        document = change.get("fullDocument")
+        if document is None:
+            return
+        legs = document.get("legs") or [document]
+        for account_id in [leg["account_id"] for leg in legs if leg["account_id"] in self._backlog]:
+            transaction = transaction_from_entry(dict(document), account_id)
+            self._publish(account_id, "transaction", transaction_adapter.dump_json(transaction).decode())
+
+    def _publish(self, account_id: str, kind: str, data: str):
+        self.sequence += 1
+        event = (self.sequence, kind, data)
+
+        backlog = self._backlog[account_id]
+        if len(backlog[1]) == backlog[1].maxlen:
+            backlog[0] = backlog[1][0][0]
+        backlog[1].append(event)
+
+        for queue in list(self._subscribers.get(account_id, ())):
+            try:
+                queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # A stalled client is cut loose and resumes from its Last-Event-ID.
+                self.lagged += 1
+                self._subscribers[account_id].discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def event_id(self, sequence: int) -> str:
+        return f"{self.epoch}-{sequence}"
+
+    def _replay(self, account_id: str, last_event_id: Optional[str]) -> Optional[List[Event]]:
+        backlog = self._backlog.get(account_id)
+        if not last_event_id or backlog is None:
+            return None
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) < backlog[0]:
+            return None
+        return [event for event in backlog[1] if event[0] > int(sequence)]
+
+    @asynccontextmanager
+    async def subscribe(self, account_id: str, last_event_id: Optional[str] = None):
+        if account_id in self._backlog:
+            self._backlog.move_to_end(account_id)
+        else:
+            self._backlog[account_id] = [self.sequence, deque(maxlen=self.backlog_size)]
+            while len(self._backlog) > self.backlog_accounts:
+                oldest = next(iter(self._backlog))
+                if oldest in self._subscribers:
+                    break
+                self._backlog.popitem(last=False)
+
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        replay = self._replay(account_id, last_event_id)
+        self._subscribers.setdefault(account_id, set()).add(queue)
+        try:
+            yield queue, replay
+        finally:
+            queues = self._subscribers.get(account_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[account_id]
+
+
+stream_hub = ChangeStreamHub()
+
+
+def _frame(event: Event) -> str:
+    sequence, kind, data = event
+    return f"id: {stream_hub.event_id(sequence)}\nevent: {kind}\ndata: {data}\n\n"
+
+async def account_events(user_id: str, account_id: str, last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+    async with stream_hub.subscribe(account_id, last_event_id) as (queue, replay):
+        yield f"retry: {int(STREAM_RETRY_SECONDS * 1000)}\n\n"
+        if replay is None:
+            # Subscribed before reading, so nothing committed after the snapshot is missed.
+            sequence = stream_hub.sequence
+            balance = await get_user_balance(user_id, account_id)
+            yield _frame((sequence, "balance", json.dumps({"account_id": account_id, "balance": str(balance)})))
+        else:
+            for event in replay:
+                yield _frame(event)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                return
+            yield _frame(event)
@@ -1,225 +1,524 @@
 from fastapi import HTTPException, status
-from typing import Optional, List
+from typing import Dict, Optional, List, Literal, AsyncIterator, Tuple
+from datetime import datetime
 from bson import ObjectId
 from bson.decimal128 import Decimal128
 from decimal import Decimal
+import csv
+import io
+import json
+import os
+from pymongo import UpdateOne
 
 from ..models.transaction import Transaction
-from ..models.account import Account
-from .account import get_user_account
-from ..database import db, transactions_collection, accounts_collection
-
-
-async def user_deposit(user_id: str, amount: Decimal, description: Optional[str] = None) -> Transaction:
-    account = await get_user_account(user_id)
-
-    if not account.id:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Account ID is missing or invalid"
-        )
-    balance_before = account.balance
-    balance_after = balance_before + amount
-
-    transaction = Transaction(
-        account_id=account.id,
-        transaction_type="deposit",
-        amount=amount,
-        description=description,
-        balance_before=balance_before,
-        balance_after=balance_after
-    )
-
-    async with await db.client.start_session() as session:
-        async with session.start_transaction():
-            await accounts_collection.update_one(
-                {"_id": ObjectId(account.id)},
-                {
-                    "$set": {"balance": Decimal128(balance_after)},
-                    "$currentDate": {"updated_at": True}
-                }
+from ..models.journal import JournalEntry, JournalLeg
+from ..models.mapping import ledger_row, transaction_from_entry
+from ..core.pagination import encode_cursor, decode_cursor, keyset_filter
+from ..core.transactions import run_transaction, account_locks
+from ..core.consistency import read_session, record_write
+from ..schemas.transaction import TransferRequest, BatchTransferItemResult, BatchTransferResult, TransactionPage
+from .account import resolve_account_id
+from .balance import credit_account, debit_account, balance_of
+from .rollup import record_rollups
+from .coalesce import KeyedCoalescer
+from .archive import find_history, iterate_history, naive_utc
+from .idempotency import IdempotencyClaim, IdempotencyKeyUsed
+from ..database import transactions_collection, accounts_collection
+
+
+DEPOSIT_COALESCING = os.getenv("DEPOSIT_COALESCING", "false").lower() == "true"
+DEPOSIT_COALESCE_WINDOW_MS = float(os.getenv("DEPOSIT_COALESCE_WINDOW_MS", "3"))
+DEPOSIT_COALESCE_MAX_BATCH = int(os.getenv("DEPOSIT_COALESCE_MAX_BATCH", "100"))
+
+
+async def user_deposit(
+        user_id: str,
+        amount: Decimal,
+        description: Optional[str] = None,
+        account_id: Optional[str] = None,
+        idempotency: Optional[IdempotencyClaim] = None
+) -> Transaction:
+    account_id = await resolve_account_id(user_id, account_id)
+    if DEPOSIT_COALESCING:
+        while True:
+            try:
+                return await deposit_coalescer.submit((user_id, account_id), (amount, description, idempotency))
+            except IdempotencyKeyUsed as e:
+                if idempotency is not None and e.scoped_key == idempotency.scoped_key:
+                    raise
+                # A reused key elsewhere in the batch aborted it; post this deposit again.
+
+    async def _deposit(session) -> Transaction:
+        account_data = await credit_account(_owned_account(user_id, account_id), amount, session=session)
+        if not account_data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Account not found"
             )
 
-            transaction_dict = transaction.dict(exclude={'id'})
-            for field in ['amount', 'balance_before', 'balance_after']:
-                if field in transaction_dict and isinstance(transaction_dict[field], Decimal):
-                    transaction_dict[field] = Decimal128(transaction_dict[field])
+        balance_after = balance_of(account_data)
+        entry = JournalEntry(
+            transaction_type="deposit",
+            amount=amount,
+            description=description,
+            legs=[JournalLeg(account_id=account_id, direction="credit", balance_before=balance_after - amount, balance_after=balance_after)]
+        )
+        await _post_entry(entry, session=session)
+        transaction = _entry_view(entry, account_id)
+        await record_rollups([transaction], session=session)
+        if idempotency is not None:
+            await idempotency.record(transaction, session)
+        return transaction
 
-            result = await transactions_collection.insert_one(transaction_dict)
-            transaction.id = str(result.inserted_id)
-            transaction.status = "completed"
+    async with account_locks.hold(_lock_key(account_id)):
+        return await run_transaction(_deposit, "deposit", on_commit=lambda session: record_write(user_id, session))
+    
+async def user_deposit_batch(
+        user_id: str,
+        account_id: str,
+        deposits: List[Tuple[Decimal, Optional[str], Optional[IdempotencyClaim]]]
+) -> List[Transaction]:
+    total_amount = sum((amount for amount, _, _ in deposits), Decimal("0"))
 
-            await transactions_collection.update_one(
-                {"_id": result.inserted_id},
-                {"$set": {"status": "completed"}}
+    async def _deposit_batch(session) -> List[Transaction]:
+        account_data = await credit_account(_owned_account(user_id, account_id), total_amount, session=session)
+        if not account_data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Account not found"
             )
 
-        return transaction
+        balance = balance_of(account_data) - total_amount
+        entries = []
+        for amount, description, _ in deposits:
+            entries.append(JournalEntry(
+                transaction_type="deposit",
+                amount=amount,
+                description=description,
+                legs=[JournalLeg(account_id=account_id, direction="credit", balance_before=balance, balance_after=balance + amount)]
+            ))
+            balance += amount
+
+        await _post_entries(entries, session=session)
+        transactions = [_entry_view(entry, account_id) for entry in entries]
+        await record_rollups(transactions, session=session)
+        for (_, _, idempotency), transaction in zip(deposits, transactions):
+            if idempotency is not None:
+                await idempotency.record(transaction, session)
+        return transactions
+
+    async with account_locks.hold(_lock_key(account_id)):
+        return await run_transaction(_deposit_batch, "deposit_batch", on_commit=lambda session: record_write(user_id, session))
+
+deposit_coalescer = KeyedCoalescer(
+    lambda key, deposits: user_deposit_batch(*key, deposits),
+    window_seconds=DEPOSIT_COALESCE_WINDOW_MS / 1000,
+    max_batch=DEPOSIT_COALESCE_MAX_BATCH
+)
     
-async def user_withdrawal(user_id: str, amount: Decimal, description: Optional[str] = None):
-    account = await get_user_account(user_id)
-    if account.balance < amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient funds"
+async def user_withdrawal(
+        user_id: str,
+        amount: Decimal,
+        description: Optional[str] = None,
+        account_id: Optional[str] = None,
+        idempotency: Optional[IdempotencyClaim] = None
+) -> Transaction:
+    account_id = await resolve_account_id(user_id, account_id)
+
+    async def _withdraw(session) -> Transaction:
+        account_filter = _owned_account(user_id, account_id)
+        account_data = await debit_account(account_filter, amount, session=session)
+        if not account_data:
+            await _raise_debit_failure(account_filter, session=session)
+
+        balance_after = balance_of(account_data)
+        entry = JournalEntry(
+            transaction_type="withdrawal",
+            amount=amount,
+            description=description,
+            legs=[JournalLeg(account_id=account_id, direction="debit", balance_before=balance_after + amount, balance_after=balance_after)]
         )
-    
-    balance_before = account.balance
-    balance_after = balance_before - amount
-
-    transaction = Transaction(
-        account_id=account.id,
-        transaction_type="withdrawal",
-        amount=amount,
-        description=description,
-        balance_before=balance_before,
-        balance_after=balance_after
-    )
-
-    async with await db.client.start_session() as session:
-        async with session.start_transaction():
-            await accounts_collection.update_one(
-                {"_id": ObjectId(account.id)},
-                {
-                    "$set": {"balance": Decimal128(balance_after)},
-                    "$currentDate": {"updated_at": True}
-                }
-            )
-
-            transaction_dict = transaction.dict(exclude={'id'})
-            for field in ['amount', 'balance_before', 'balance_after']:
-                if field in transaction_dict and isinstance(transaction_dict[field], Decimal):
-                    transaction_dict[field] = Decimal128(transaction_dict[field])
+        await _post_entry(entry, session=session)
+        transaction = _entry_view(entry, account_id)
+        await record_rollups([transaction], session=session)
+        if idempotency is not None:
+            await idempotency.record(transaction, session)
+        return transaction
 
-            result = await transactions_collection.insert_one(transaction_dict)
-            transaction.id = str(result.inserted_id)
-            transaction.status = "completed"
-
-            await transactions_collection.update_one(
-                {"_id": result.inserted_id},
-                {"$set": {"status": "completed"}}
-            )
-    
-    return transaction
+    async with account_locks.hold(_lock_key(account_id)):
+        return await run_transaction(_withdraw, "withdrawal", on_commit=lambda session: record_write(user_id, session))
 
 async def user_transfer(
         from_user_id: str,
         to_account_number: str,
         amount: Decimal,
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        account_id: Optional[str] = None,
+        idempotency: Optional[IdempotencyClaim] = None
 ) -> Transaction:
-    
-    from_account = await get_user_account(from_user_id)
-    if from_account.balance < amount:
+    from_account_id = await resolve_account_id(from_user_id, account_id)
+    to_account_id = (await _account_ids([to_account_number])).get(to_account_number)
+    if to_account_id is None:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient funds"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Recipient account not found"
         )
-    
-    to_account_data = await accounts_collection.find_one({"account_number": to_account_number})
-    if not to_account_data:
+    if to_account_id == from_account_id:
         raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot transfer to same account"
+        )
+
+    async def _transfer(session) -> Transaction:
+        from_account_filter = _owned_account(from_user_id, from_account_id)
+        from_account_data = await debit_account(from_account_filter, amount, session=session)
+        if not from_account_data:
+            await _raise_debit_failure(from_account_filter, session=session)
+
+        to_account_data = await credit_account({"_id": ObjectId(to_account_id)}, amount, session=session)
+        if not to_account_data:
+            raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Recipient account not found"
             )
-    
-    if isinstance(to_account_data.get("balance"), Decimal128):
-        to_account_data["balance"] = to_account_data["balance"].to_decimal()
-
-    to_account_data["id"] = str(to_account_data["_id"])
-    to_account = Account(**to_account_data)
 
-    if from_account.id == to_account.id:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cannot transfer to same account"
+        from_balance_after = balance_of(from_account_data)
+        to_balance_after = balance_of(to_account_data)
+
+        entry = JournalEntry(
+            transaction_type="transfer",
+            amount=amount,
+            description=description,
+            legs=[
+                JournalLeg(
+                    account_id=from_account_id,
+                    direction="debit",
+                    balance_before=from_balance_after + amount,
+                    balance_after=from_balance_after
+                ),
+                JournalLeg(
+                    account_id=to_account_id,
+                    direction="credit",
+                    balance_before=to_balance_after - amount,
+                    balance_after=to_balance_after,
+                    description=f"Transfer from {from_account_data['account_number']}"
+                )
+            ]
         )
-    
-    sender_transaction = Transaction(
-        account_id=from_account.id,
-        transaction_type="transfer",
-        amount=amount,
-        description=description,
-        balance_before=from_account.balance,
-        balance_after=from_account.balance - amount,
-        recipient_account_id=to_account.id
-    )
 
-    recipient_transaction = Transaction(
-        account_id=to_account.id,
-        transaction_type="transfer",
-        amount=amount,
-        description=f"Transfer from {from_account.account_number}",
-        balance_before=to_account.balance,
-        balance_after=to_account.balance + amount,
-        recipient_account_id=from_account.id
-    )
+        await _post_entry(entry, session=session)
+        sender_transaction = _entry_view(entry, from_account_id)
+        await record_rollups([sender_transaction, _entry_view(entry, to_account_id)], session=session)
+        if idempotency is not None:
+            await idempotency.record(sender_transaction, session)
+        return sender_transaction
+
+    async with account_locks.hold(_lock_key(from_account_id), _lock_key(to_account_id)):
+        return await run_transaction(_transfer, "transfer", on_commit=lambda session: record_write(from_user_id, session))
 
-    async with await db.client.start_session() as session:
-        async with session.start_transaction():
-            await accounts_collection.update_one(
-                {"_id": ObjectId(from_account.id)},
-                {
-                    "$set": {"balance": Decimal128(sender_transaction.balance_after)},
-                    "$currentDate": {"updated_at": True}
-                }
+async def user_batch_transfer(
+        from_user_id: str,
+        transfers: List[TransferRequest],
+        account_id: Optional[str] = None,
+        idempotency: Optional[IdempotencyClaim] = None
+) -> BatchTransferResult:
+    from_account_id = await resolve_account_id(from_user_id, account_id)
+    recipient_ids = await _account_ids({item.to_account_number for item in transfers})
+
+    async def _batch_transfer(session) -> BatchTransferResult:
+        results: List[Optional[BatchTransferItemResult]] = [None] * len(transfers)
+
+        from_account_data = await accounts_collection.find_one(_owned_account(from_user_id, from_account_id), session=session)
+        if not from_account_data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Account not found"
             )
 
-            await accounts_collection.update_one(
-                {"_id": ObjectId(to_account.id)},
-                {
-                    "$set": {"balance": Decimal128(recipient_transaction.balance_after)},
-                    "$currentDate": {"updated_at": True}
-                }
+        account_numbers = list({item.to_account_number for item in transfers})
+        recipients = {}
+        async for account_data in accounts_collection.find(
+            {"account_number": {"$in": account_numbers}},
+            {"account_number": 1, "balance": 1},
+            session=session
+        ):
+            recipients[account_data["account_number"]] = account_data
+
+        sender_balance = balance_of(from_account_data)
+        recipient_balances = {number: balance_of(data) for number, data in recipients.items()}
+        credits = {}
+        entries = []
+        accepted = []
+
+        for index, item in enumerate(transfers):
+            if item.to_account_number == from_account_data["account_number"]:
+                detail = "Cannot transfer to same account"
+            elif item.to_account_number not in recipients:
+                detail = "Recipient account not found"
+            elif sender_balance < item.amount:
+                detail = "Insufficient funds"
+            else:
+                detail = None
+
+            if detail:
+                results[index] = BatchTransferItemResult(
+                    index=index,
+                    to_account_number=item.to_account_number,
+                    amount=item.amount,
+                    status="failed",
+                    detail=detail
+                )
+                continue
+
+            to_account_data = recipients[item.to_account_number]
+            to_account_id = str(to_account_data["_id"])
+            recipient_balance = recipient_balances[item.to_account_number]
+
+            entries.append(JournalEntry(
+                transaction_type="transfer",
+                amount=item.amount,
+                description=item.description,
+                legs=[
+                    JournalLeg(
+                        account_id=from_account_id,
+                        direction="debit",
+                        balance_before=sender_balance,
+                        balance_after=sender_balance - item.amount
+                    ),
+                    JournalLeg(
+                        account_id=to_account_id,
+                        direction="credit",
+                        balance_before=recipient_balance,
+                        balance_after=recipient_balance + item.amount,
+                        description=f"Transfer from {from_account_data['account_number']}"
+                    )
+                ]
+            ))
+
+            sender_balance -= item.amount
+            recipient_balances[item.to_account_number] = recipient_balance + item.amount
+            credits[to_account_data["_id"]] = credits.get(to_account_data["_id"], Decimal("0")) + item.amount
+            accepted.append(index)
+
+        total_amount = sum((transfers[index].amount for index in accepted), Decimal("0"))
+        if accepted:
+            if not await debit_account({"_id": from_account_data["_id"]}, total_amount, session=session):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Account balance changed during batch transfer"
+                )
+
+            await accounts_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": account_id},
+                        {
+                            "$inc": {"balance": credit},
+                            "$currentDate": {"updated_at": True}
+                        }
+                    )
+                    for account_id, credit in credits.items()
+                ],
+                ordered=False,
+                session=session
             )
 
-            sender_dict = sender_transaction.dict(exclude={'id'})
-            recipient_dict = recipient_transaction.dict(exclude={'id'})
+            await _post_entries(entries, session=session)
+            await record_rollups(
+                [_entry_view(entry, leg.account_id) for entry in entries for leg in entry.legs],
+                session=session
+            )
+
+            for position, index in enumerate(accepted):
+                item = transfers[index]
+                results[index] = BatchTransferItemResult(
+                    index=index,
+                    to_account_number=item.to_account_number,
+                    amount=item.amount,
+                    status="completed",
+                    transaction_id=entries[position].id
+                )
+        result = BatchTransferResult(
+            succeeded=len(accepted),
+            failed=len(transfers) - len(accepted),
+            total_amount=total_amount,
+            results=results
+        )
+        if idempotency is not None:
+            await idempotency.record(result, session)
+        return result
+
+    async with account_locks.hold(_lock_key(from_account_id), *(_lock_key(to_account_id) for to_account_id in recipient_ids.values())):
+        return await run_transaction(_batch_transfer, "batch_transfer", on_commit=lambda session: record_write(from_user_id, session))
+
+def _owned_account(user_id: str, account_id: str) -> dict:
+    return {"_id": ObjectId(account_id), "user_id": user_id}
+
+def _lock_key(account_id: str) -> str:
+    # Every path locks by account id so deposits, withdrawals and incoming
+    # transfers to the same account share a stripe.
+    return f"account:{account_id}"
+
+async def _account_ids(account_numbers) -> Dict[str, str]:
+    return {
+        account_data["account_number"]: str(account_data["_id"])
+        async for account_data in accounts_collection.find(
+            {"account_number": {"$in": list(account_numbers)}}, {"account_number": 1}
+        )
+    }
 
-            for field in ['amount', 'balance_before', 'balance_after']:
-                sender_dict[field] = Decimal128(sender_dict[field])
-                recipient_dict[field] = Decimal128(recipient_dict[field])
+async def _raise_debit_failure(account_filter: dict, session=None):
+    if not await accounts_collection.find_one(account_filter, {"_id": 1}, session=session):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Account not found"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Insufficient funds"
+    )
 
-            sender_result = await transactions_collection.insert_one(sender_dict)
-            recipient_result = await transactions_collection.insert_one(recipient_dict)
+def _entry_document(entry: JournalEntry) -> dict:
+    return entry.dict(exclude={'id'})
 
-            sender_transaction.id = str(sender_result.inserted_id)
-            recipient_transaction.id = str(recipient_result.inserted_id)
+def _entry_view(entry: JournalEntry, account_id: str) -> Transaction:
+    return transaction_from_entry({**_entry_document(entry), "_id": entry.id}, account_id)
 
-            sender_transaction.status = "completed"
-            recipient_transaction.status = "completed"
+async def _post_entry(entry: JournalEntry, session=None):
+    # Entries are immutable and written already completed: one insert per movement.
+    result = await transactions_collection.insert_one(_entry_document(entry), session=session)
+    entry.id = str(result.inserted_id)
 
-            await transactions_collection.update_one(
-                {"_id": sender_result.inserted_id},
-                {"$set": {"status": "completed"}}
-            )
+async def _post_entries(entries: List[JournalEntry], session=None):
+    result = await transactions_collection.insert_many([_entry_document(entry) for entry in entries], session=session)
+    for entry, inserted_id in zip(entries, result.inserted_ids):
+        entry.id = str(inserted_id)
 
-            await transactions_collection.update_one(
-                {"_id": recipient_result.inserted_id},
-                {"$set": {"status": "completed"}}
-            )
+def ledger_filter(account_id: str) -> dict:
+    # Journal entries are found through the multikey legs index; rows written
+    # before the journal keep their top-level account_id.
+    return {"$or": [{"legs.account_id": account_id}, {"account_id": account_id}]}
 
-    return sender_transaction
+TRANSACTION_SORT = [("timestamp", -1), ("_id", -1)]
 
 async def get_user_transactions(
         user_id: str,
         skip: int = 0,
         limit: int = 10,
-        transaction_type: Optional[str] = None
+        transaction_type: Optional[str] = None,
+        account_id: Optional[str] = None
 ) -> List[Transaction]:
-    account = await get_user_account(user_id)
+    account_id = await resolve_account_id(user_id, account_id)
+
+    query = ledger_filter(account_id)
+    if transaction_type:
+        query["transaction_type"] = transaction_type
+
+    async with read_session(user_id) as session:
+        documents = await find_history(query, TRANSACTION_SORT, limit, skip=skip, session=session)
 
-    query = {"account_id": account.id}
+    return [transaction_from_entry(transaction, account_id) for transaction in documents]
+
+async def get_user_transactions_page(
+        user_id: str,
+        limit: int = 10,
+        after: Optional[str] = None,
+        transaction_type: Optional[str] = None,
+        account_id: Optional[str] = None
+) -> TransactionPage:
+    account_id = await resolve_account_id(user_id, account_id)
+
+    query = ledger_filter(account_id)
     if transaction_type:
         query["transaction_type"] = transaction_type
+    before = None
+    if after:
+        query = {"$and": [query, keyset_filter(after)]}
+        before = naive_utc(decode_cursor(after)[0])
+
+    async with read_session(user_id) as session:
+        documents = await find_history(query, TRANSACTION_SORT, limit + 1, session=session, end=before)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1]["timestamp"], documents[-1]["_id"])
+
+    return TransactionPage(
+        items=[transaction_from_entry(transaction, account_id) for transaction in documents],
+        next_cursor=next_cursor
+    )
 
-    transactions = []
-    transactions_cursor = transactions_collection.find(query).sort("created_at", -1).skip(skip).limit(limit)
-    async for transaction in transactions_cursor:
+EXPORT_FIELDS = [
+    "_id", "timestamp", "transaction_type", "amount", "balance_before",
+    "balance_after", "status", "description", "recipient_account_id"
+]
+EXPORT_BATCH_SIZE = 2000
+EXPORT_ROWS_PER_CHUNK = 500
 
-        for field in ["amount", "balance_before", "balance_after"]:
-            if isinstance(transaction.get(field), Decimal128):
-                transaction[field] = transaction[field].to_decimal()
-        transactions.append(Transaction(**transaction))
+async def export_user_transactions(
+        user_id: str,
+        export_format: Literal["csv", "ndjson"] = "csv",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        transaction_type: Optional[str] = None,
+        account_id: Optional[str] = None
+) -> AsyncIterator[str]:
+    account_id = await resolve_account_id(user_id, account_id)
+    start, end = naive_utc(start), naive_utc(end)
+
+    query = ledger_filter(account_id)
+    if transaction_type:
+        query["transaction_type"] = transaction_type
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
+
+    documents = iterate_history(
+        query,
+        [("timestamp", 1), ("_id", 1)],
+        {**{field: 1 for field in EXPORT_FIELDS}, "legs": 1},
+        batch_size=EXPORT_BATCH_SIZE,
+        start=start,
+        end=end
+    )
 
-    return transactions
\ No newline at end of file
+    return _export_rows((ledger_row(document, account_id) async for document in documents), export_format)
+
+def _export_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (Decimal, Decimal128, ObjectId)):
+        return str(value)
+    return value
+
+async def _export_rows(documents: AsyncIterator[dict], export_format: str) -> AsyncIterator[str]:
+    columns = ["id" if field == "_id" else field for field in EXPORT_FIELDS]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows = 0
+
+    if export_format == "csv":
+        writer.writerow(columns)
+
+    async for document in documents:
+        values = [_export_value(document.get(field)) for field in EXPORT_FIELDS]
+        if export_format == "csv":
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values)), separators=(",", ":")))
+            buffer.write("\n")
+
+        rows += 1
+        if rows % EXPORT_ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import os
+import random
+import string
+import time
+from pymongo import ASCENDING
+import motor.motor_asyncio
+
+from app.services.account import AccountNumberAllocator
+
+
+async def probe_allocate(accounts) -> str:
+    while True:
+        account_number = ''.join(random.choices(string.digits, k=10))
+        if not await accounts.find_one({"account_number": account_number}):
+            return account_number
+
+async def seed(accounts, existing: int, batch_size: int = 10000):
+    present = await accounts.estimated_document_count()
+    for offset in range(present, existing, batch_size):
+        size = min(batch_size, existing - offset)
+        await accounts.insert_many(
+            [{"account_number": f"{number:010d}", "user_id": f"bench-{number}"} for number in range(offset, offset + size)],
+            ordered=False
+        )
+
+async def measure(label: str, allocate, accounts, samples: int) -> dict:
+    started = time.perf_counter()
+    for _ in range(samples):
+        number = await allocate()
+        await accounts.insert_one({"account_number": number})
+    elapsed = time.perf_counter() - started
+    result = {"allocator": label, "samples": samples, "ops_per_second": samples / elapsed, "mean_ms": elapsed / samples * 1000}
+    print(f"{label:>8}: {result['ops_per_second']:10.1f} ops/s  {result['mean_ms']:.3f} ms/op")
+    return result
+
+async def main(args):
+    client = motor.motor_asyncio.AsyncIOMotorClient(os.environ["MONGODB_URL"])
+    db = client[args.database]
+    accounts = db.get_collection("accounts")
+    await accounts.create_index([("account_number", ASCENDING)], unique=True)
+
+    print(f"seeding {args.existing} accounts ...")
+    await seed(accounts, args.existing)
+
+    allocator = AccountNumberAllocator(collection=db.get_collection("counters"), start=args.existing)
+    await measure("block", allocator.allocate, accounts, args.samples)
+    await measure("probe", lambda: probe_allocate(accounts), accounts, args.samples)
+    print(f"blocks reserved: {allocator.blocks_reserved} for {args.samples} accounts")
+
+    if args.drop:
+        await client.drop_database(args.database)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare block allocation with random probing for account numbers")
+    parser.add_argument("--existing", type=int, default=10_000_000)
+    parser.add_argument("--samples", type=int, default=10_000)
+    parser.add_argument("--database", default="user_money_bench")
+    parser.add_argument("--drop", action="store_true")
+    asyncio.run(main(parser.parse_args()))
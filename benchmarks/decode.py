@@ -0,0 +1,66 @@
+import argparse
+import time
+from datetime import datetime
+from decimal import Decimal
+import bson
+from bson import ObjectId
+from bson.codec_options import DEFAULT_CODEC_OPTIONS
+from bson.decimal128 import Decimal128
+
+from app.core.codecs import codec_options
+from app.models.mapping import transaction_from_document
+from app.models.transaction import Transaction
+
+
+def build_page(rows: int) -> bytes:
+    account_id = str(ObjectId())
+    documents = []
+    for index in range(rows):
+        documents.append({
+            "_id": ObjectId(),
+            "account_id": account_id,
+            "transaction_type": "deposit",
+            "amount": Decimal128(Decimal("125.50")),
+            "description": f"Deposit {index}",
+            "balance_before": Decimal128(Decimal(index) * Decimal("125.50")),
+            "balance_after": Decimal128(Decimal(index + 1) * Decimal("125.50")),
+            "timestamp": datetime.utcnow(),
+            "status": "completed",
+            "recipient_account_id": None,
+            "created_at": datetime.utcnow(),
+        })
+    return bson.encode({"batch": documents})
+
+def legacy_decode(page: bytes):
+    transactions = []
+    for transaction in bson.decode(page, codec_options=DEFAULT_CODEC_OPTIONS)["batch"]:
+        for field in ["amount", "balance_before", "balance_after"]:
+            if isinstance(transaction.get(field), Decimal128):
+                transaction[field] = transaction[field].to_decimal()
+        transaction["id"] = str(transaction["_id"])
+        transactions.append(Transaction(**transaction))
+    return transactions
+
+def mapper_decode(page: bytes):
+    return [transaction_from_document(document) for document in bson.decode(page, codec_options=codec_options)["batch"]]
+
+def measure(label: str, decode, page: bytes, repeat: int) -> float:
+    decode(page)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        decode(page)
+    per_page = (time.perf_counter() - started) / repeat
+    print(f"{label:>7}: {per_page * 1000:8.3f} ms per page")
+    return per_page
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare decode cost of a transaction history page")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    page = build_page(args.rows)
+    legacy = measure("legacy", legacy_decode, page, args.repeat)
+    mapper = measure("mapper", mapper_decode, page, args.repeat)
+    print(f"speedup: {legacy / mapper:.2f}x for {args.rows}-row pages")
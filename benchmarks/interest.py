@@ -0,0 +1,32 @@
+import argparse
+import random
+import time
+from array import array
+from decimal import Decimal
+
+from app.jobs.interest import RateTable
+
+
+DEFAULT_TIERS = [(Decimal("0"), Decimal("0.0300")), (Decimal("100000"), Decimal("0.0425")), (Decimal("1000000"), Decimal("0.0500"))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the CPU cost of one day of interest accrual")
+    parser.add_argument("--accounts", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    rates = RateTable(DEFAULT_TIERS)
+    balances = array("q", (random.randrange(0, 500_000_000) for _ in range(args.accounts)))
+    carries = array("q", (random.randrange(0, 1_000_000) for _ in range(args.accounts)))
+
+    started = time.perf_counter()
+    posted_total = 0
+    for offset in range(0, args.accounts, args.batch_size):
+        posted, _ = rates.accrue(balances[offset:offset + args.batch_size], carries[offset:offset + args.batch_size])
+        posted_total += sum(posted)
+    seconds = time.perf_counter() - started
+
+    print(f"accounts: {args.accounts}")
+    print(f"interest posted: {Decimal(posted_total) / 100}")
+    print(f"accrual CPU: {seconds:.2f}s ({args.accounts / seconds:,.0f} accounts/s)")
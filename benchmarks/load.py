@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Awaitable, Callable, List
+import httpx
+
+from app.main import app
+from app.core.metrics import MONGO_COMMANDS, TRANSACTION_ABORTS
+from app.indexes import ensure_indexes
+from .seed import BENCH_PASSWORD, reset_data, seed_users, total_balance
+
+
+WORKLOADS = ["deposit", "withdraw", "transfer", "history", "login"]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, users: List[dict]):
+        self.client = client
+        self.users = users
+        self.deposited = Decimal("0")
+        self.withdrawn = Decimal("0")
+
+    def _auth(self, user: dict) -> dict:
+        return {"Authorization": f"Bearer {user['token']}"}
+
+    async def deposit(self) -> httpx.Response:
+        user = random.choice(self.users)
+        amount = Decimal(random.randint(1, 10000)) / 100
+        response = await self.client.post("/transaction/deposit", json={"amount": str(amount)}, headers=self._auth(user))
+        if response.status_code == 200:
+            self.deposited += amount
+        return response
+
+    async def withdraw(self) -> httpx.Response:
+        user = random.choice(self.users)
+        amount = Decimal(random.randint(1, 10000)) / 100
+        response = await self.client.post("/transaction/withdraw", json={"amount": str(amount)}, headers=self._auth(user))
+        if response.status_code == 200:
+            self.withdrawn += amount
+        return response
+
+    async def transfer(self) -> httpx.Response:
+        sender, recipient = random.sample(self.users, 2)
+        amount = Decimal(random.randint(1, 10000)) / 100
+        return await self.client.post(
+            "/transaction/transfer",
+            json={"to_account_number": recipient["account_number"], "amount": str(amount)},
+            headers=self._auth(sender)
+        )
+
+    async def history(self) -> httpx.Response:
+        user = random.choice(self.users)
+        return await self.client.get("/transaction/transactions", params={"cursor": "true", "limit": 20}, headers=self._auth(user))
+
+    async def login(self) -> httpx.Response:
+        user = random.choice(self.users)
+        return await self.client.post("/auth/login", data={"username": user["email"], "password": BENCH_PASSWORD})
+
+
+async def drive(operation: Callable[[], Awaitable[httpx.Response]], operations: int, concurrency: int) -> dict:
+    latencies = []
+    statuses = {}
+    remaining = operations
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await operation()
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    commands_before = MONGO_COMMANDS.total()
+    aborts_before = TRANSACTION_ABORTS.total()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    completed = len(latencies)
+    return {
+        "operations": completed,
+        "seconds": elapsed,
+        "ops_per_second": completed / elapsed if elapsed else 0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0,
+        "mongo_round_trips_per_op": (MONGO_COMMANDS.total() - commands_before) / completed if completed else 0,
+        "transaction_aborts": TRANSACTION_ABORTS.total() - aborts_before,
+        "abort_rate": (TRANSACTION_ABORTS.total() - aborts_before) / completed if completed else 0,
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+async def main(args):
+    await ensure_indexes()
+    if args.reset:
+        await reset_data()
+
+    users = await seed_users(args.users, Decimal(args.opening_balance))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        workload = Workload(client, users)
+        results = {
+            "started_at": datetime.utcnow().isoformat(),
+            "revision": git_revision(),
+            "parameters": vars(args),
+            "workloads": {},
+            "invariants": {},
+        }
+
+        for name in args.workloads:
+            balance_before = await total_balance()
+            deposited, withdrawn = workload.deposited, workload.withdrawn
+
+            result = await drive(getattr(workload, name), args.operations, args.concurrency)
+            results["workloads"][name] = result
+
+            expected = balance_before + (workload.deposited - deposited) - (workload.withdrawn - withdrawn)
+            actual = await total_balance()
+            results["invariants"][name] = {"expected_total": str(expected), "actual_total": str(actual), "ok": expected == actual}
+
+            print(
+                f"{name:>9}: {result['ops_per_second']:9.1f} ops/s  p50 {result['p50_ms']:7.2f} ms  "
+                f"p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+                f"{result['mongo_round_trips_per_op']:.2f} rt/op  aborts {result['transaction_aborts']:.0f}  "
+                f"balances {'ok' if expected == actual else 'MISMATCH'}"
+            )
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"results written to {args.output}")
+
+    if not all(check["ok"] for check in results["invariants"].values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the money-movement endpoints through the ASGI app")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--opening-balance", default="100000.00")
+    parser.add_argument("--operations", type=int, default=5000, help="operations per workload")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=WORKLOADS)
+    parser.add_argument("--reset", action="store_true", help="delete users, accounts and transactions first")
+    parser.add_argument("--output", default=f"benchmarks/results/load-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    asyncio.run(main(parser.parse_args()))
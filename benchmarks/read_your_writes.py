@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import os
+import time
+from decimal import Decimal
+
+os.environ.setdefault("MONGODB_READ_PREFERENCE", "secondary")
+
+from app.core.consistency import reader, read_preference
+from app.database import accounts_collection
+from app.indexes import ensure_indexes
+from app.services.account import get_user_balance
+from app.services.balance import balance_of
+from app.services.transaction import user_deposit, get_user_transactions
+from .seed import seed_users, reset_data
+
+
+async def check_user(user: dict, rounds: int, amount: Decimal, counts: dict):
+    for _ in range(rounds):
+        transaction = await user_deposit(user["user_id"], amount)
+
+        # Issue the session-less read alongside the causal one so it sees the
+        # same replication lag rather than reading after the causal read waited.
+        started = time.perf_counter()
+        balance, account_data = await asyncio.gather(
+            get_user_balance(user["user_id"]),
+            reader(accounts_collection).find_one({"user_id": user["user_id"]}, {"balance": 1})
+        )
+        counts["causal_seconds"] += time.perf_counter() - started
+        if balance != transaction.balance_after:
+            counts["causal_stale_balance"] += 1
+        if balance_of(account_data) != transaction.balance_after:
+            counts["plain_stale_balance"] += 1
+
+        history = await get_user_transactions(user["user_id"], limit=1)
+        if not history or history[0].id != transaction.id:
+            counts["causal_stale_history"] += 1
+        counts["reads"] += 1
+
+async def main(args):
+    await ensure_indexes()
+    if args.reset:
+        await reset_data()
+
+    users = await seed_users(args.users, Decimal("0.00"))
+    counts = {"reads": 0, "causal_seconds": 0.0, "causal_stale_balance": 0, "causal_stale_history": 0, "plain_stale_balance": 0}
+    await asyncio.gather(*(check_user(user, args.rounds, Decimal(args.amount), counts) for user in users))
+
+    print(f"read preference: {read_preference.mongos_mode}")
+    print(f"write-then-read rounds: {counts['reads']}")
+    print(f"stale balances with causal session: {counts['causal_stale_balance']}")
+    print(f"stale history with causal session: {counts['causal_stale_history']}")
+    print(f"stale balances without session: {counts['plain_stale_balance']}")
+    print(f"mean balance read round trip: {counts['causal_seconds'] / max(1, counts['reads']) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check read-your-writes for secondary reads against a replica set")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--amount", default="10.00")
+    parser.add_argument("--reset", action="store_true", help="delete users, accounts and transactions first")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,79 @@
+import secrets
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+from bson import ObjectId
+
+from app.core.codecs import to_decimal
+from app.core.security import get_password_hash
+from app.database import users_collection, accounts_collection, transactions_collection
+from app.services.account import AccountNumberAllocator
+from app.services.auth import token_pair
+
+
+BENCH_PASSWORD = "bench-password"
+
+
+async def reset_data():
+    await users_collection.delete_many({})
+    await accounts_collection.delete_many({})
+    await transactions_collection.delete_many({})
+
+async def seed_users(count: int, opening_balance: Decimal, batch_size: int = 1000) -> List[dict]:
+    password_hash = get_password_hash(BENCH_PASSWORD)
+    run_id = secrets.token_hex(4)
+    now = datetime.utcnow()
+    seeded = []
+    # Numbers come from the same counter as real accounts, so repeated runs
+    # without --reset never collide on the unique account_number index.
+    allocator = AccountNumberAllocator(block_size=batch_size)
+
+    for offset in range(0, count, batch_size):
+        size = min(batch_size, count - offset)
+        users = [
+            {
+                "_id": ObjectId(),
+                "email": f"bench-{run_id}-{index}@example.com",
+                "password_hash": password_hash,
+                "full_name": f"Bench User {index}",
+                "phone_number": f"0800{index:07d}",
+                "is_active": True,
+                "is_verified": True,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for index in range(offset, offset + size)
+        ]
+        accounts = [
+            {
+                "user_id": str(user["_id"]),
+                "account_type": "savings",
+                "account_number": await allocator.allocate(),
+                "balance": opening_balance,
+                "is_active": True,
+                "currency": "NGN",
+                "created_at": now,
+                "updated_at": now,
+            }
+            for user in users
+        ]
+        # Accounts first: if they are rejected, no users are left without one.
+        await accounts_collection.insert_many(accounts)
+        await users_collection.insert_many(users)
+
+        for user, account in zip(users, accounts):
+            seeded.append({
+                "user_id": str(user["_id"]),
+                "email": user["email"],
+                "account_number": account["account_number"],
+                # Same claims as a login, so requests skip the principal lookup.
+                "token": token_pair(str(user["_id"]), user["email"], 0, True, str(account["_id"]))["access_token"],
+            })
+
+    return seeded
+
+async def total_balance() -> Decimal:
+    result = await accounts_collection.aggregate([
+        {"$group": {"_id": None, "total": {"$sum": {"$toDecimal": "$balance"}}}}
+    ]).to_list(length=1)
+    return to_decimal(result[0]["total"]) if result else Decimal("0")
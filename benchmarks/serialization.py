@@ -0,0 +1,66 @@
+import argparse
+import json
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from app.models.transaction import Transaction
+
+
+adapter = TypeAdapter(List[Transaction])
+
+
+def build_page(rows: int) -> List[Transaction]:
+    account_id = str(ObjectId())
+    return [
+        Transaction.model_construct(
+            id=str(ObjectId()),
+            account_id=account_id,
+            transaction_type="deposit",
+            amount=Decimal("125.50"),
+            description=f"Deposit {index}",
+            balance_before=Decimal(index) * Decimal("125.50"),
+            balance_after=Decimal(index + 1) * Decimal("125.50"),
+            timestamp=datetime.utcnow(),
+            status="completed",
+            recipient_account_id=None,
+            created_at=datetime.utcnow(),
+        )
+        for index in range(rows)
+    ]
+
+def response_model_path(page: List[Transaction]) -> bytes:
+    # What FastAPI does for response_model=List[Transaction]: dump, re-validate,
+    # serialize to JSON-compatible Python, then json.dumps in JSONResponse.
+    validated = adapter.validate_python([transaction.model_dump() for transaction in page])
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def typed_json_path(page: List[Transaction]) -> bytes:
+    return adapter.dump_json(page)
+
+def measure(serialize, page: List[Transaction], repeat: int) -> float:
+    serialize(page)
+    started = time.process_time()
+    for _ in range(repeat):
+        serialize(page)
+    return (time.process_time() - started) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU time per response for response_model vs TypeAdapter.dump_json")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for rows in args.sizes:
+        page = build_page(rows)
+        baseline = measure(response_model_path, page, args.repeat)
+        fast = measure(typed_json_path, page, args.repeat)
+        print(
+            f"{rows:5d} rows: response_model {baseline * 1000:8.3f} ms  "
+            f"dump_json {fast * 1000:8.3f} ms  saved {(baseline - fast) * 1000:8.3f} ms ({baseline / fast:.1f}x)"
+        )
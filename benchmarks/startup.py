@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+
+
+def measure_import(repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"],
+            check=True, capture_output=True, text=True
+        )
+        timings.append(float(output.stdout.strip()))
+    return timings
+
+def slowest_imports(limit: int) -> list:
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        check=True, capture_output=True, text=True
+    )
+    rows = []
+    for line in output.stderr.splitlines()[1:]:
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative_us), int(self_us), module))
+    return sorted(rows, reverse=True)[:limit]
+
+async def measure_lifespan() -> dict:
+    from app.main import app, startup_timings
+
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter() - started
+    return {"ready_seconds": ready, **startup_timings}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import time and lifespan startup of the application")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--skip-lifespan", action="store_true", help="only measure imports (no MongoDB needed)")
+    args = parser.parse_args()
+
+    timings = measure_import(args.repeat)
+    print(f"import app.main: median {statistics.median(timings) * 1000:.1f} ms over {args.repeat} cold processes")
+    for cumulative_us, self_us, module in slowest_imports(args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms cumulative  {self_us / 1000:7.1f} ms self  {module}")
+
+    if not args.skip_lifespan:
+        result = asyncio.run(measure_lifespan())
+        print(
+            f"lifespan startup: ready in {result['ready_seconds'] * 1000:.1f} ms "
+            f"(pool warm-up {result['warm_up_seconds'] * 1000:.1f} ms)"
+        )